@@ -2,9 +2,14 @@
 Contains multiple auxiliary functions.
 
 List of functions:
+    - price_store (loads the forecasted and real prices once into arrays indexed by date)
+    - date_index (returns the row of a given date in the price store)
     - scenario_generation (generates a number of m price scenarios based on a point forecast)
-    - real_price (reads the real price of a given date from the csv)
+    - scenario_tensor (generates the price scenarios of "scenario_generation" for many dates and improvement scalars at once)
+    - real_price (reads the real price of a given date from the price store)
     - perfect_information_bid (computes the optimal dispatch and maximal utility which can be obtained, which equals a bid under perfect information)
+    - perfect_information_table (computes or loads the perfect information bids of all days in the price store)
+    - market_clearing (given a bid and the real prices of many days, it computes the market clearing outcomes of all days at once)
     - bid_outcome (given a bid and the real price, it computes the market clearing outcome assuming a duality gap of zero of the market clearing program)
     
     
@@ -12,7 +17,9 @@ List of functions to explore impact of the probabilistic forecast:
     - scenario_generation_improved_information (generates scenarios as in "scenario_generation" but tightens the scenarios closer
                                                  to the real price afterwards to simulate improved information)
     - wasserstein_distance (computes the wasserstein distance between two discrete probability measures)
+    - wasserstein_dirac (computes the wasserstein distances between real prices and scenario sets for many days and improvement scalars at once)
     - wasserstein_year (computes the wasserstein distances for a whole year)
+    - scenario_reduction (reduces a set of scenarios to fewer weighted representatives with minimal wasserstein distance)
     
 """
 
@@ -21,13 +28,120 @@ import gurobipy as gp #makes all Gurobi functions and classes available
 from gurobipy import GRB #makes everything in class GRB available without a prefix (e.g., GRB.OPTIMAL)
 import numpy as np
 import Case_Study_Models as cs
+import Bid_Structure as bs
 import pandas as pd
 import ot
 import random
 from datetime import datetime, timedelta
 import csv
+import os
+import hashlib
+from multiprocessing import Pool
 import pandas as pd
 
+#Price store shared by all functions of this module - loaded on first use (see price_store)
+_price_store = None
+
+#Perfect information tables already loaded in this process (see perfect_information_table)
+_perfect_information_tables = {}
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def price_store(sidecar=False):
+    """
+    Loads the forecasted and real prices once into contiguous arrays (days x hours)
+    and keeps them in memory for all following calls. 
+
+    Parameters
+    ----------
+    sidecar : bool
+        If True, the arrays are read from the binary files "Dates_DE.npy", "Forecast_DE.npy" and "Real_DE.npy" 
+        as memory-mapped arrays. They are written from the csv files first if missing or older than the csv files.
+        Lets worker processes open the prices without parsing the csv files.
+
+    Returns
+    -------
+    store : dictionary
+        "dates" : array of dates (strings in the form of "12/01/2017")
+        "index" : dictionary mapping each date to its row number
+        "forecasts" : read-only array of point forecasts, one row per date
+        "prices" : read-only array of real prices, one row per date
+        "residuals" : read-only array of forecast errors (forecast - real price), one row per date
+
+    """
+    
+    global _price_store
+    
+    #Prices already loaded?
+    if _price_store is not None:
+        return _price_store
+    
+    files = {"dates": 'Dates_DE.npy', "forecasts": 'Forecast_DE.npy', "prices": 'Real_DE.npy'}
+    
+    #Sidecar files up to date?
+    up_to_date = sidecar and all( os.path.exists(f) and os.path.getmtime(f) >= max(os.path.getmtime('Forecast_DE.csv'), os.path.getmtime('Real_DE.csv')) for f in files.values() )
+    
+    if up_to_date:
+        
+        #Open memory-mapped arrays
+        arrays = { key : np.load(f, mmap_mode='r') for key, f in files.items() }
+        
+    else:
+        
+        #Read csv with forecasts and real prices into pandas dataframe
+        forecasts = pd.read_csv('Forecast_DE.csv')
+        prices = pd.read_csv('Real_DE.csv')
+        
+        #Both files have to contain the same dates in the same order
+        if not (forecasts['Date'] == prices['Date']).all():
+            raise ValueError("Forecast_DE.csv and Real_DE.csv contain different dates.")
+        
+        #Convert to contiguous arrays (days x hours)
+        arrays = {"dates": forecasts['Date'].to_numpy(dtype=str),
+                  "forecasts": np.ascontiguousarray(forecasts.loc[:, "h0":].to_numpy(dtype=float)),
+                  "prices": np.ascontiguousarray(prices.loc[:, "h0":].to_numpy(dtype=float))}
+        
+        #Write binary sidecar files
+        if sidecar:
+            for key, f in files.items():
+                np.save(f, arrays[key])
+    
+    #Residuals of all point forecasts
+    arrays["residuals"] = arrays["forecasts"] - arrays["prices"]
+    
+    #Lookups return views - protect the stored prices against modification
+    for array in arrays.values():
+        array.setflags(write=False)
+    
+    #Hash index date -> row number
+    arrays["index"] = { date : row for row, date in enumerate(arrays["dates"].tolist()) }
+    
+    _price_store = arrays
+    
+    return _price_store
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def date_index(date):
+    """
+    Returns the row number of date (string in the form of "12/01/2017") in the price store.
+    """
+    
+    index = price_store()["index"]
+    
+    if date not in index:
+        raise KeyError("No prices available for " + str(date))
+    
+    return index[date]
+
+
 ##############################################################################################################################################################################################
 #--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 ##############################################################################################################################################################################################
@@ -43,43 +157,81 @@ def scenario_generation(forecast_date, number_scenarios):
     forecast_date : String in the form of "12/01/2017" 
         Date for which a probabilistic forecast is generated
     number_scenarios : int >0
-        Number of scenarios in the discrete probability distribution
+        Number of scenarios in the discrete probability distribution. At most the number of days before forecast_date 
+        in the price store plus one (1096 on 31/12/2017), otherwise a ValueError is raised.
+
+    Returns
+    -------
+    Array of price scenarios (one row per scenario) of length n= number_scenarios
+
+    """
+    
+    scenarios = scenario_tensor(forecast_date, number_scenarios)
+        
+    return scenarios
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def scenario_tensor(forecast_dates, number_scenarios, improvement_scalars=None):
+    """
+    Generates the price scenarios of "scenario_generation" for one or many dates at once. 
+    Optionally tightens them towards the real price for one or many improvement scalars as in "scenario_generation_improved_information".
+    The residual history is taken as strided windows over the residual array of the price store - no scenario is built in a loop.
+
+    Parameters
+    ----------
+    forecast_dates : String in the form of "12/01/2017" or list of such strings
+        Date(s) for which a probabilistic forecast is generated
+    number_scenarios : int >0
+        Number of scenarios in the discrete probability distribution (limited by the price history, see "scenario_generation")
+    improvement_scalars : None, float in [0,1] or list of floats in [0,1]
+        Tightens the scenarios closer to real price. If None, the scenarios are not tightened.
 
     Returns
     -------
-    List of price scenarios of length n= number_scenarios
+    Array of price scenarios with shape (number_scenarios x hours) for a single date, (dates x number_scenarios x hours) for a list of dates.
+    A list of improvement scalars adds a leading axis (scalars x ...).
 
     """
     
-    #Read csv with forecasts and real prices into pandas dataframe
-    forecasts = pd.read_csv('Forecast_DE.csv')
-    prices = pd.read_csv('Real_DE.csv')
+    #Load price store
+    store = price_store()
     
-    #Determine row number of forecast_date
-    row_number = forecasts[ forecasts['Date'] == forecast_date ].index[0]
+    #Determine row numbers of forecast_dates
+    single_date = isinstance(forecast_dates, str)
+    dates = [forecast_dates] if single_date else list(forecast_dates)
+    rows = np.array([date_index(date) for date in dates], dtype=int)
     
-    #Get point forecast 
-    point_forecast = forecasts.loc[row_number, "h0":].values.flatten().tolist()
+    if len(rows) > 0 and rows.min() < number_scenarios - 1:
+        raise ValueError("Not enough past days before " + dates[rows.argmin()] + " to generate " + str(number_scenarios) + " scenarios.")
     
-    #Initalize scenario list with point forecast
-    scenarios = [point_forecast]
+    #Windows of n-1 residuals (n=number_scenarios) over the reversed residual history - window k starts at row N-1-k 
+    residuals = store["residuals"][::-1]
+    windows = np.lib.stride_tricks.sliding_window_view(residuals, number_scenarios - 1, axis=0)
     
-    #Generate n-1 additional scenarios where n=number_scenarios
+    #Residuals of the past n-1 days of each date - most recent day first (dates x n-1 x hours)
+    history = windows[len(residuals) - rows].transpose(0, 2, 1)
     
-    #Iterate over past n-1 days and add residuals to point forecast
-    for i in range(number_scenarios-1):
-        
-        #Get real and forecasted price of past i day 
-        real_price = prices.loc[row_number-i-1, "h0":].values.flatten().tolist()
-        forecast_price = forecasts.loc[row_number-i-1, "h0":].values.flatten().tolist()
-        
-        #Compute residual and add to point forecast
-        residual = np.array(forecast_price) - np.array(real_price)
-        scenario = np.array(point_forecast) - residual
-        
-        #Add scenario to list
-        scenarios.append(scenario.tolist())
+    #Add residuals to point forecasts - first scenario is the point forecast itself
+    point_forecasts = store["forecasts"][rows]
+    scenarios = np.empty((len(rows), number_scenarios, residuals.shape[1]))
+    scenarios[:, 0] = point_forecasts
+    scenarios[:, 1:] = point_forecasts[:, np.newaxis, :] - history
+    
+    #Tighten scenarios - improve them
+    if improvement_scalars is not None:
         
+        scalars = np.asarray(improvement_scalars, dtype=float)
+        difference = scenarios - store["prices"][rows][:, np.newaxis, :]
+        scenarios = scenarios - scalars[..., np.newaxis, np.newaxis, np.newaxis] * difference # if improvement_scalar==1 then improved_scenario==real price
+    
+    if single_date:
+        scenarios = scenarios[..., 0, :, :]
+    
     return scenarios
 
 
@@ -89,17 +241,11 @@ def scenario_generation(forecast_date, number_scenarios):
 
 def real_price(date):
     """
-    Reads the real price of date from csv.
+    Returns the real price of date from the price store (read-only array view).
     """
     
-    #Read csv with forecasts and real prices into pandas dataframe
-    prices = pd.read_csv('Real_DE.csv')
-    
-    #Determine row number of forecast_date
-    row_number = prices[ prices['Date'] == date ].index[0]
-    
     #Get real price
-    real_price = prices.loc[row_number, "h0":].values.flatten().tolist()
+    real_price = price_store()["prices"][date_index(date)]
     
     return real_price
 
@@ -140,52 +286,185 @@ def perfect_information_bid(case_study, case_data, Time_set, real_price):
     Prices = [real_price]
     
     #----------------------------------------
-    # Loading case study model
+    # Loading case study model template
     #----------------------------------------
- 
-    if case_study == "thermal generator":
+    
+    m = cs.model_template(case_study, case_data, Time_set, len(Scenario_set))
+    if m is None:
+        return
+    
+    #-----------------------------------
+    # Solve case study and retrieve dispatches and valuations
+    #-----------------------------------
+    cs.optimize_template(m, Prices, Probabilities)
+    
+    #Retrieve dispatches and profit
+    bundle = m.getAttr("X", m._x_tilde)
+    utility = m.ObjVal
+    
+    return bundle, utility
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def perfect_information_table(case_study, case_data, Time_set, processes=None, filename=None):
+    """
+    Computes the perfect information bid (see "perfect_information_bid") for every day in the price store
+    and stores the bundles and utilities in a compact table (.npz file). 
+    If the file already exists for the same case study, it is loaded instead. 
+
+    Parameters
+    ----------
+    case_study : String 
+        Selects the case study which is run.
+    case_data : List
+        List of parameters necessary to specify the case study. 
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices. 
+    processes : None or int >0
+        Number of worker processes solving the days in parallel. If None, the days are solved one after the other.
+    filename : String
+        File of the table. Default: "Perfect_Information_<case study>.npz"
+
+    Returns
+    -------
+    table : dictionary
+        "bundles" : array of optimal bundles, one row per date in the price store (see "date_index")
+        "utilities" : array of maximal utilities, one entry per date in the price store
+    (None if the case study is not known)
+
+    """
+    
+    if filename is None:
+        filename = 'Perfect_Information_' + case_study.replace(" ", "_") + '.npz'
+    
+    #Table identified by case study, its parameters and the time set
+    key = hashlib.sha256(repr((case_study, case_data, list(Time_set))).encode()).hexdigest()
+    
+    #Already loaded?
+    if (filename, key) in _perfect_information_tables:
+        return _perfect_information_tables[(filename, key)]
+    
+    dates = price_store()["dates"]
+    prices = price_store()["prices"]
+    
+    #Load table from file if it belongs to the same case study and price data
+    table = None
+    if os.path.exists(filename):
+        with np.load(filename) as data:
+            if str(data["key"]) == key and np.array_equal(data["dates"], dates):
+                table = {"bundles": data["bundles"], "utilities": data["utilities"]}
+    
+    if table is None:
+        
+        #Case study known? - checked once before the days are solved
+        if cs.model_template(case_study, case_data, Time_set, 1) is None:
+            return
         
-        #Read unit characteristics from "case_data"
-        No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost, Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, Max_production_block, Min_up_time, Min_down_time, Initial_operating_state, Initial_off_hours, Initial_on_hours = case_data
+        #Solve perfect information problem for every day
+        arguments = [ (case_study, case_data, Time_set, prices[row].tolist()) for row in range(len(dates)) ]
         
-        #Load model
-        m = cs.thermal_generator(Time_set, Scenario_set, Prices, Probabilities, No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost, Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, Max_production_block, Min_up_time, Min_down_time, Initial_operating_state, Initial_off_hours, Initial_on_hours)
-        m.update()
+        if processes is None or processes == 1:
+            results = [ perfect_information_bid(*args) for args in arguments ]
+        else:
+            with Pool(processes) as pool:
+                results = pool.starmap(perfect_information_bid, arguments, chunksize = max(1, len(arguments) // (4 * processes)))
         
-    elif case_study == "battery":
+        if any( result is None for result in results ):
+            return
         
-        #Read unit characteristics from "case_data"
-        Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge = case_data
+        table = {"bundles": np.array([ bundle for bundle, utility in results ]), 
+                 "utilities": np.array([ utility for bundle, utility in results ])}
         
-        #Load model
-        m = cs.battery(Time_set, Scenario_set, Prices, Probabilities, Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge)
-        m.update()      
+        #Write table
+        np.savez(filename, key=key, dates=dates, bundles=table["bundles"], utilities=table["utilities"])
+    
+    _perfect_information_tables[(filename, key)] = table
+    
+    return table
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def market_clearing(case_study, case_data, Time_set, quantities, prices, real_prices, bid_type):
+    """
+    Computes the market clearing outcome of a bid for many days at once, assuming a duality gap of zero of the market clearing program.
+    Exclusive group: the atomic bid with the largest non-negative surplus p_b - real_price * x_b is accepted (none if all are negative).
+    Self-schedule: the single bundle is accepted regardless of the price.
+
+    Parameters
+    ----------
+    case_study : String 
+        Selects the case study. Possible values: "thermal generator", "battery", "demand response"
+    case_data : List
+        List of parameters necessary to specify the case study. 
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices. 
+    quantities : array (B x Time_set)
+        Bundles x_b of the atomic bids (a single row for a self-schedule)
+    prices : array (length: B) or None
+        Prices p_b of the atomic bids (not used for a self-schedule)
+    real_prices : array (D x Time_set)
+        Real prices of D days
+    bid_type : string
+        "exclusive" or "self-schedule"
+
+    Returns
+    -------
+    accepted : array of int (length: D)
+        Index of the accepted atomic bid per day (-1 if no bid is accepted)
+    bundles : array (D x Time_set)
+        Traded bundle per day
+    surplus : array (length: D)
+        Surplus p_b - real_price * x_b of the accepted atomic bid per day (- real_price * x for a self-schedule, 0 if no bid is accepted)
+    utilities : array (length: D)
+        Utility v(x) - real_price * x of the traded bundle per day. NaN if the bundle is infeasible.
+    (None if the case study or bid type is not known)
+
+    """
+    
+    quantities = np.atleast_2d(np.asarray(quantities, dtype=float))
+    real_prices = np.atleast_2d(np.asarray(real_prices, dtype=float))
+    
+    #Cost of each atomic bid on each day (D x B)
+    cost = real_prices @ quantities.T
+    
+    if bid_type == "exclusive":
         
-    elif case_study == "demand response":
+        #Most profitable atomic bid per day - accepted if its surplus is non-negative (an empty group is never accepted)
+        profits = np.asarray(prices, dtype=float) - cost
+        best = np.argmax(profits, axis=1) if len(quantities) > 0 else np.zeros(len(real_prices), dtype=int)
+        best_profit = profits[np.arange(len(real_prices)), best] if len(quantities) > 0 else np.full(len(real_prices), -np.inf)
+        accepted = np.where(best_profit >= 0, best, -1)
+        surplus = np.where(accepted >= 0, best_profit, 0.0)
         
-        #Read unit characteristics from "case_data"
-        Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price, Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost = case_data
+    elif bid_type == "self-schedule":
         
-        #Load model
-        m = cs.demand_response(Time_set, Scenario_set, Prices, Probabilities, Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price, Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost)
-        m.update()   
+        accepted = np.zeros(len(real_prices), dtype=int)
+        surplus = -cost[:, 0]
         
     else:
-        print("Case study not known.")
+        print("Bid type not known.")
         return
     
-    #-----------------------------------
-    # Solve case study and retrieve dispatches and valuations
-    #-----------------------------------
-    m.Params.LogToConsole = 0
-    m.optimize()
+    #Traded bundles - the last row is the empty bundle of days without an accepted bid
+    candidates = np.vstack([ quantities, np.zeros(len(Time_set)) ])
+    bundles = candidates[accepted]
     
-    #Retrieve dispatches and profit
-    bundle = [ m.getVarByName("x_tilde"+"["+str(0)+","+str(t)+"]").X for t in Time_set ] 
-    utility = m.ObjVal
+    #Each traded bundle is valued once - utilities are dot products with the real prices
+    traded, inverse = np.unique(accepted, return_inverse=True)
+    valuations = cs.bundle_valuation(case_study, case_data, Time_set, candidates[traded])
+    if valuations is None:
+        return
+    utilities = valuations[inverse.reshape(-1)] - np.einsum("dt,dt->d", real_prices, bundles)
     
-    return bundle, utility
-
+    return accepted, bundles, surplus, utilities
 
 ##############################################################################################################################################################################################
 #--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -207,10 +486,10 @@ def bid_outcome(case_study, case_data, Time_set, real_price, bid, bid_type, Bid_
         List of time step indices. 
     real_price : list of floats
         Real prices for all hours.
-    bid : dictionary
-        Contains all atomic bids (x,p) pairs
+    bid : Bid or dictionary
+        Contains all atomic bids (x,p) pairs (see "Bid", or dictionary with keys "x"+str(b) and "p"+str(b))
     bid_type : string
-        Exclusive group or self-schedule?
+        Exclusive group or self-schedule? ("exclusive" or "self-schedule", see "market_clearing")
     Bid_set : list of integers 0,1,2,3, .... B
         List of bid indices.
 
@@ -224,75 +503,22 @@ def bid_outcome(case_study, case_data, Time_set, real_price, bid, bid_type, Bid_
     """
     
     #----------------------------------------
-    # Determining traded bundle
+    # Determining traded bundle and utility
     #----------------------------------------
     
-    #List of profits of the single atomic bids 
-    profits = np.array( [ ( bid["p"+str(b)] - sum( real_price[t] * bid["x"+str(b)][t] for t in Time_set) ) for b in Bid_set ] )
-    
-    #Determine bundle for exclusive group
-    if bid_type == "exclusive":
-        
-        if max(profits) >= 0:
-            b_opt = np.argmax(profits)
-            bundle = bid["x"+str(b_opt)]
-        else:
-            bundle = np.zeros(len(Time_set))
-                
-
-    #----------------------------------------
-    # Determine utility gained by traded bundle
-    #----------------------------------------
+    #Atomic bids as quantity matrix and price vector - dictionaries of atomic bids are converted
+    if not isinstance(bid, bs.Bid):
+        bid = bs.Bid.from_dict(bid, Bid_set)
+    elif len(bid) > 0 and list(Bid_set) != list(range(len(bid))):
+        bid = bid[list(Bid_set)]
     
-    #Setting Scenarios to perfect information
-    Scenario_set = [0]
-    Probabilities = [1]
-    Prices = [real_price]
- 
-    #Load case study model
-    if case_study == "thermal generator":
-        
-        #Read unit characteristics from "case_data"
-        No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost, Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, Max_production_block, Min_up_time, Min_down_time, Initial_operating_state, Initial_off_hours, Initial_on_hours = case_data
-        
-        #Load model
-        m = cs.thermal_generator(Time_set, Scenario_set, Prices, Probabilities, No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost, Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, Max_production_block, Min_up_time, Min_down_time, Initial_operating_state, Initial_off_hours, Initial_on_hours)
-        m.update()
-        
-    elif case_study == "battery":
-        
-        #Read unit characteristics from "case_data"
-        Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge = case_data
-        
-        #Load model
-        m = cs.battery(Time_set, Scenario_set, Prices, Probabilities, Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge)
-        m.update()  
-        
-    elif case_study == "demand response":
-        
-        #Read unit characteristics from "case_data"
-        Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price, Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost = case_data
-        
-        #Load model
-        m = cs.demand_response(Time_set, Scenario_set, Prices, Probabilities, Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price, Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost)
-        m.update()    
-        
-    else:
-        print("Case study not known.")
+    outcome = market_clearing(case_study, case_data, Time_set, bid.quantities, bid.prices, [real_price], bid_type)
+    if outcome is None:
         return
-    
-    #Fix bundle to certain value
-    m.addConstrs( m.getVarByName("x_tilde"+"["+str(s)+","+str(t)+"]") == bundle[t]  for t in Time_set for s in Scenario_set )
-    
-    #Solve model and retrieve utility
-    
-    m.Params.LogToConsole = 0
-    m.optimize()
+    accepted, bundles, surplus, utilities = outcome
+    bundle, utility = bundles[0], utilities[0]
 
-    if m.SolCount > 0: #model has found a solution - bundle is feasible
-        utility = m.ObjVal  
-        
-    else: #model has found no solution - bundle is infeasible
+    if np.isnan(utility): #bundle is infeasible
         utility = -1
         print("Bundle infeasible")
         
@@ -321,45 +547,11 @@ def scenario_generation_improved_information(forecast_date, number_scenarios, im
 
     Returns
     -------
-    List of price scenarios of length n= number_scenarios
+    Array of price scenarios (one row per scenario) of length n= number_scenarios
 
     """
     
-    #Read csv with forecasts and real prices into pandas dataframe
-    forecasts = pd.read_csv('Forecast_DE.csv')
-    prices = pd.read_csv('Real_DE.csv')
-    
-    #Determine row number of forecast_date
-    row_number = forecasts[ forecasts['Date'] == forecast_date ].index[0]
-    
-    #Get point forecast 
-    point_forecast = forecasts.loc[row_number, "h0":].values.flatten()
-    
-    #Initalize scenario list with point forecast
-    #Tighten point forecast - improve it
-    real_price_next_day = prices.loc[row_number, "h0":].values.flatten()
-    difference = point_forecast - real_price_next_day
-    improved_point_forecast = point_forecast - improvement_scalar * difference # if improvement_scalar==1 then improved_scenario==real price
-    scenarios = [improved_point_forecast.tolist()]
-    
-    #Generate n-1 additional scenarios where n=number_scenarios
-    #Iterate over past n-1 days and add residuals to point forecast
-    for i in range(number_scenarios-1):
-        
-        #Get real and forecasted price of past i day 
-        real_price = prices.loc[row_number-i-1, "h0":].values.flatten().tolist()
-        forecast_price = forecasts.loc[row_number-i-1, "h0":].values.flatten().tolist()
-        
-        #Compute residual and add to point forecast
-        residual = np.array(forecast_price) - np.array(real_price)
-        scenario = np.array(point_forecast) - residual
-        
-        #Tighten scenario - improve it
-        difference = scenario - real_price_next_day
-        improved_scenario = scenario - improvement_scalar * difference # if improvement_scalar==1 then improved_scenario==real price
-        
-        #Add scenario to list
-        scenarios.append(improved_scenario.tolist())
+    scenarios = scenario_tensor(forecast_date, number_scenarios, improvement_scalar)
         
     return scenarios
 
@@ -372,11 +564,19 @@ def scenario_generation_improved_information(forecast_date, number_scenarios, im
 def wasserstein_distance(P_scenarios, P_probs, Q_scenarios, Q_probs):
     """
     Computes the Wasserstein distance between two discrete probability distributions P and Q.
+    If one distribution consists of a single scenario (e.g., the real price), all probability is transported to this scenario and 
+    the distance is the probability weighted mean of the distances to it (see "wasserstein_dirac") - no transport problem is solved.
     """
     
     # Convert scenarios and probabilities to numpy arrays
-    P_samples = np.array(P_scenarios)
-    Q_samples = np.array(Q_scenarios)
+    P_samples = np.array(P_scenarios, dtype=float)
+    Q_samples = np.array(Q_scenarios, dtype=float)
+    
+    # Closed form if one distribution is a single point
+    if len(P_samples) == 1:
+        return float(wasserstein_dirac(P_samples[0], Q_samples, Q_probs))
+    if len(Q_samples) == 1:
+        return float(wasserstein_dirac(Q_samples[0], P_samples, P_probs))
 
     # Compute the distance matrix
     distance_matrix = np.linalg.norm(P_samples[:, np.newaxis] - Q_samples, axis=2)
@@ -392,10 +592,56 @@ def wasserstein_distance(P_scenarios, P_probs, Q_scenarios, Q_probs):
 ##############################################################################################################################################################################################
 
 
-def wasserstein_year():
+def wasserstein_dirac(real_prices, scenarios, probabilities, improvement_scalars=None):
+    """
+    Computes the Wasserstein distances between the degenerate distributions given by the real prices and the distributions of 
+    the price scenarios for many days at once, i.e., the probability weighted mean of the distances between real price and scenarios.
+    Scenarios tightened towards the real price by an improvement scalar (see "scenario_generation_improved_information") have 
+    exactly (1 - improvement scalar) times the distance - the distances of all scalars are obtained from the ones of the original scenarios.
+
+    Parameters
+    ----------
+    real_prices : list or array (hours) or (days x hours)
+        Real price of each day
+    scenarios : array (scenarios x hours) or (days x scenarios x hours)
+        Price scenarios of each day (not tightened)
+    probabilities : list or array (scenarios) or (days x scenarios)
+        Probability of each scenario
+    improvement_scalars : None, float in [0,1] or list of floats in [0,1]
+        Improvement scalars of the tightened scenarios. A list adds a leading axis (scalars x ...).
+
+    Returns
+    -------
+    Array of wasserstein distances with shape (days) for a list of days or a float for a single day.
+    A list of improvement scalars adds a leading axis (scalars x ...).
+
+    """
+    
+    real_prices = np.asarray(real_prices, dtype=float)
+    scenarios = np.asarray(scenarios, dtype=float)
+    
+    # Probability weighted mean of the distances between the real price and the scenarios
+    distances = np.linalg.norm(scenarios - real_prices[..., np.newaxis, :], axis=-1)
+    wasserstein_distances = np.sum(np.asarray(probabilities, dtype=float) * distances, axis=-1)
+    
+    # Tightened scenarios - distance scales with the remaining difference to the real price
+    if improvement_scalars is not None:
+        scalars = np.asarray(improvement_scalars, dtype=float)
+        wasserstein_distances = np.abs(1 - scalars)[(...,) + (np.newaxis,) * wasserstein_distances.ndim] * wasserstein_distances
+    
+    return wasserstein_distances
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def wasserstein_year(improvement_scalar=0.5, number_scenarios=180):
     """
     Computes the wasserstein distances between the probability distribution obtained by the scenario generation method above 
     and the degenerate distribution given by the real price for a whole year and write its to a csv.
+    The distances of the improved forecast are computed for the given improvement scalar (see "scenario_generation_improved_information").
     """
     
     #-------------------------
@@ -414,33 +660,14 @@ def wasserstein_year():
     while current_date <= end_date:
         date_list.append(current_date.strftime("%d/%m/%Y"))
         current_date += timedelta(days=1)
-        
-    #Time set - 24 hours
-    Time_set = [i for i in range(24)]
     
-    #List of wasserstein distances
-    list_wass1 = []
-    list_wass2 = []
+    #Forecasts and real prices of all days
+    scenarios = scenario_tensor(date_list, number_scenarios)
+    Probabilities = [1/number_scenarios for i in range(number_scenarios)]
+    realprices = [real_price(date) for date in date_list]
     
-    #Iterate over days
-    for date in date_list:
-        
-        #Get forecast
-        scenarios1 = scenario_generation_improved_information(date, 180)
-        scenarios2 = scenario_generation(date, 180)
-        Probabilities = [1/180 for i in range(180)]
-        
-        #Real price
-        realprice = [real_price(date)]
-        
-        #Distributions
-        wass1 = wasserstein_distance(realprice, [1], scenarios1, Probabilities)
-        wass2 = wasserstein_distance(realprice, [1], scenarios2, Probabilities)
-        
-        #Add to list
-        list_wass1.append(wass1)
-        list_wass2.append(wass2)
-        
+    #Distances of all days - improved forecast (scalars[0]) and real forecast (scalars[1])
+    list_wass1, list_wass2 = wasserstein_dirac(realprices, scenarios, Probabilities, [improvement_scalar, 0])
         
     # Create DataFrames from the lists
     df = pd.DataFrame( [list_wass1, list_wass2] ).T
@@ -453,3 +680,108 @@ def wasserstein_year():
     
     return
 
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def scenario_reduction(Prices, Probabilities, number_representatives, method="forward"):
+    """
+    Reduces a discrete probability distribution of price scenarios to a number of representative scenarios (a subset of the scenarios). 
+    The representatives are chosen such that the wasserstein distance (distance of scenarios as in "wasserstein_distance") to the original 
+    distribution is small. The probability of each scenario is assigned to its closest representative, which is the optimal transport 
+    for the chosen representatives - the reduction distance is thus the wasserstein distance of both distributions.
+    
+    Methods:
+        - "forward": fast forward selection - representatives are added one by one, each minimizing the distance of the reduced distribution.
+        - "k-medoids": starts from the fast forward selection and alternately assigns the scenarios to the closest representative and 
+                       chooses the scenario with the minimal transport cost in each cluster as its representative until nothing changes.
+                       A representative without assigned scenarios (duplicate scenarios) is kept.
+    
+    The scenario sets of "scenario_generation" are limited by the price history: a date with k past days in the price store has at most
+    k+1 scenarios (at most 1096 on 31/12/2017). Reductions are used by the bid determination via "reduce_to" (see "exclusive_linear").
+
+    Parameters
+    ----------
+    Prices : list of list or array (S x T)
+        Price scenarios
+    Probabilities : list of floats (length: S)
+        Probability of each scenario
+    number_representatives : int >0
+        Number of scenarios of the reduced distribution
+    method : String
+        Reduction method: "forward" or "k-medoids"
+
+    Returns
+    -------
+    indices : array of int
+        Indices of the representative scenarios in Prices
+    probabilities : array
+        Probabilities of the representative scenarios
+    distance : float
+        Wasserstein distance between the original and the reduced distribution
+
+    """
+    
+    Prices = np.asarray(Prices, dtype=float)
+    Probabilities = np.asarray(Probabilities, dtype=float)
+    number_representatives = min(number_representatives, len(Prices))
+    
+    # Distance matrix of the scenarios
+    squared_norms = np.einsum("ij,ij->i", Prices, Prices)
+    distance_matrix = np.sqrt(np.maximum(squared_norms[:, np.newaxis] + squared_norms[np.newaxis, :] - 2 * Prices @ Prices.T, 0))
+    np.fill_diagonal(distance_matrix, 0)
+    
+    #-------------------------
+    # Fast forward selection
+    #-------------------------
+    
+    indices = []
+    closest = np.full(len(Prices), np.inf) #distance of each scenario to its closest representative
+    for k in range(number_representatives):
+        
+        # Distance of the reduced distribution for each additional representative - representatives already selected have distance zero
+        distances = np.minimum(closest[np.newaxis, :], distance_matrix) @ Probabilities
+        distances[indices] = np.inf
+        u = int(np.argmin(distances))
+        
+        indices.append(u)
+        closest = np.minimum(closest, distance_matrix[u])
+    
+    indices = np.array(indices)
+    
+    #-------------------------
+    # k-medoids improvement
+    #-------------------------
+    
+    if method == "k-medoids":
+        
+        while True:
+            
+            # Assign scenarios to closest representative and choose the scenario with minimal transport cost in each cluster
+            cluster = np.argmin(distance_matrix[indices], axis=0)
+            medoids = indices.copy()
+            for c in range(len(indices)):
+                members = np.flatnonzero(cluster == c)
+                #Empty cluster (representative identical to another one, e.g. duplicate scenarios) - keep its representative
+                if len(members) > 0:
+                    medoids[c] = members[np.argmin(distance_matrix[np.ix_(members, members)] @ Probabilities[members])]
+            
+            if (distance_matrix[medoids].min(axis=0) @ Probabilities) >= (distance_matrix[indices].min(axis=0) @ Probabilities) - 1e-12:
+                break
+            indices = medoids
+    
+    elif method != "forward":
+        print("Method not known.")
+        return
+    
+    #-------------------------
+    # Redistribute probabilities
+    #-------------------------
+    
+    cluster = np.argmin(distance_matrix[indices], axis=0)
+    probabilities = np.bincount(cluster, weights=Probabilities, minlength=len(indices))
+    distance = distance_matrix[indices].min(axis=0) @ Probabilities
+    
+    return indices, probabilities, distance
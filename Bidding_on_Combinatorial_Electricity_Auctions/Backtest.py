@@ -0,0 +1,292 @@
+"""
+Contains a backtest of a fixed bidding policy over every day in the price store (Real_DE.csv), i.e. the bid is determined
+from the scenarios of each day and cleared at the real price of that day. The bid of each day is stored as a stage result,
+hence an interrupted backtest resumes with the remaining days.
+
+List of functions:
+    - policy_key (content hash of case study, case data, time set and bidding policy)
+    - policy_bid (determines the bid of a policy for one day)
+    - backtest_day (determines or loads the bid of one day and clears it at the real price)
+    - backtest (runs a bidding policy over all days in parallel and writes the outcomes into one columnar table)
+"""
+
+#import packages
+import hashlib
+import os
+import time
+import numpy as np
+from multiprocessing import Pool
+
+#import functions
+import Optimization_Models as bm
+import Auxiliary_Functions as func
+import Valuation_Cache as vc
+import Bid_Structure as bs
+
+#Valuation cache of this process (see backtest_day)
+_valuation_cache = None
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def policy_key(case_study, case_data, Time_set, policy):
+    """
+    Computes the content hash identifying the stage results of a bidding policy.
+
+    Parameters
+    ----------
+    case_study : String
+        Selects the case study.
+    case_data : List
+        List of parameters necessary to specify the case study.
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices.
+    policy : dictionary
+        Bidding policy (see "policy_bid")
+
+    Returns
+    -------
+    key : String
+        SHA-256 hex digest
+
+    """
+
+    return hashlib.sha256(repr((case_study, case_data, list(Time_set), sorted(policy.items()))).encode()).hexdigest()
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def policy_bid(case_study, case_data, Time_set, date, policy, cache=None):
+    """
+    Determines the bid of a bidding policy for one day from the scenarios of that day (see "scenario_generation").
+
+    Parameters
+    ----------
+    case_study : String
+        Selects the case study.
+    case_data : List
+        List of parameters necessary to specify the case study.
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices.
+    date : String
+        Day of the bid (in the form of "12/01/2017")
+    policy : dictionary
+        "bid_type" : "exclusive" (see "exclusive_linear") or "self-schedule" (see "self_schedule")
+        "number_scenarios" : number of scenarios
+        "number_bids" : number of atomic bids of an exclusive group
+        "timelimit" : runtime limit of gurobi in seconds
+        "options" : dictionary of further keyword arguments of "exclusive_linear" (e.g. {"engine": "greedy"}) 
+                    or "self_schedule" (e.g. {"collapse": True}), optional
+    cache : None or ValuationCache
+        Persistent cache of scenario valuations (see "exclusive_linear")
+
+    Returns
+    -------
+    bid : Bid
+        Atomic bids (a single atomic bid without price for a self-schedule, see "Bid")
+    runtime : float
+        Runtime of the bid determination in seconds
+    (None if the bid type is not known)
+
+    """
+
+    Scenario_set = [i for i in range(policy["number_scenarios"])]
+    Prices = func.scenario_generation(date, policy["number_scenarios"])
+    Probabilities = [1/policy["number_scenarios"] for i in Scenario_set]
+
+    if policy["bid_type"] == "exclusive":
+
+        Bid_set = [i for i in range(policy["number_bids"])]
+        bid, runtime = bm.exclusive_linear(case_study, case_data, Time_set, Scenario_set, Bid_set, Prices, Probabilities, policy["timelimit"],
+                                           cache=cache, **policy.get("options", {}))
+
+
+    elif policy["bid_type"] == "self-schedule":
+
+        #The utility at the real price is determined by the clearing (see "backtest_day")
+        start = time.time()
+        bid, utility = bm.self_schedule(case_study, case_data, Time_set, Scenario_set, Prices, Probabilities, policy["timelimit"], func.real_price(date),
+                                     **policy.get("options", {}))
+        runtime = time.time() - start
+
+    else:
+        print("Bid type not known.")
+        return
+
+    return bid, runtime
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def backtest_day(case_study, case_data, Time_set, date, policy, stage_directory, cache_filename=None):
+    """
+    Determines the bid of a bidding policy for one day (see "policy_bid") and clears it at the real price of that day
+    (see "market_clearing"). The bid is stored as stage result in "stage_directory" - if it is already stored, it is loaded instead.
+
+    Parameters
+    ----------
+    case_study : String
+        Selects the case study.
+    case_data : List
+        List of parameters necessary to specify the case study.
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices.
+    date : String
+        Day of the bid (in the form of "12/01/2017")
+    policy : dictionary
+        Bidding policy (see "policy_bid")
+    stage_directory : String
+        Directory of the stage results of the policy (one .npz file per day)
+    cache_filename : None or String
+        SQLite file of the persistent cache of scenario valuations (see "ValuationCache"), opened once per process
+
+    Returns
+    -------
+    outcome : dictionary
+        "date", "bundle", "accepted" (index of the accepted atomic bid, -1 if none), "surplus", "utility" (-1 if the bundle is infeasible)
+        and "runtime" (runtime of the bid determination, also if loaded)
+    (None if the bid type or case study is not known)
+
+    """
+
+    global _valuation_cache
+
+    stage_filename = os.path.join(stage_directory, date.replace("/", "-") + '.npz')
+
+    if os.path.exists(stage_filename):
+
+        #Load stored bid
+        with np.load(stage_filename) as data:
+            bid, runtime = bs.Bid(data["quantities"], data["prices"]), float(data["runtime"])
+
+    else:
+
+        #Open valuation cache of this process
+        if cache_filename is not None and (_valuation_cache is None or _valuation_cache.filename != cache_filename):
+            _valuation_cache = vc.ValuationCache(cache_filename)
+        cache = _valuation_cache if cache_filename is not None else None
+
+        result = policy_bid(case_study, case_data, Time_set, date, policy, cache)
+        if result is None:
+            return
+        bid, runtime = result
+
+        #Write stage result - renamed when complete such that an interrupted write is not loaded
+        temporary_filename = stage_filename[:-len('.npz')] + '.' + str(os.getpid()) + '.tmp.npz'
+        np.savez(temporary_filename, quantities=bid.quantities, prices=bid.prices, runtime=runtime)
+        os.replace(temporary_filename, stage_filename)
+
+    #Clear bid at the real price
+    outcome = func.market_clearing(case_study, case_data, Time_set, bid.quantities, bid.prices, [func.real_price(date)], policy["bid_type"])
+    if outcome is None:
+        return
+    accepted, bundles, surplus, utilities = outcome
+
+    utility = utilities[0]
+    if np.isnan(utility): #bundle is infeasible
+        utility = -1
+        print("Bundle infeasible")
+
+    return {"date": date, "bundle": bundles[0], "accepted": accepted[0], "surplus": surplus[0], "utility": utility, "runtime": runtime}
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def backtest(case_study, case_data, Time_set, policy, filename, dates=None, processes=None, cache_filename='Valuation_Cache.sqlite', stage_directory=None):
+    """
+    Runs a bidding policy over every day in the price store (see "backtest_day") and writes the per-day outcomes
+    together with the utility under perfect information (see "perfect_information_table") into one columnar table (.npz file).
+    Days with stored stage results are not solved again, i.e. an interrupted backtest resumes with the remaining days.
+
+    Parameters
+    ----------
+    case_study : String
+        Selects the case study.
+    case_data : List
+        List of parameters necessary to specify the case study.
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices.
+    policy : dictionary
+        Bidding policy (see "policy_bid")
+    filename : String
+        File of the table
+    dates : None or list of strings
+        Days of the backtest. Default: all days in the price store with "number_scenarios" - 1 past days
+    processes : None or int >0
+        Number of worker processes solving the days in parallel. If None, the days are solved one after the other.
+    cache_filename : None or String
+        SQLite file of the persistent cache of scenario valuations (see "ValuationCache"). If None, no cache is used.
+    stage_directory : None or String
+        Directory of the stage results. Default: "Backtest_Stages/<policy key>"
+
+    Returns
+    -------
+    table : dictionary of arrays, one entry per day
+        "dates", "utilities" (utility of the bid), "max_utilities" (utility under perfect information),
+        "captured_share" (utilities / max_utilities, NaN if max_utilities is zero), "accepted", "surplus", "runtimes" and "bundles" (days x Time_set)
+    (None if the bid type or case study is not known)
+
+    """
+
+    #All days with enough past days to generate the scenarios (see "scenario_tensor")
+    if dates is None:
+        dates = func.price_store()["dates"][policy["number_scenarios"] - 1:].tolist()
+
+    if stage_directory is None:
+        stage_directory = os.path.join('Backtest_Stages', policy_key(case_study, case_data, Time_set, policy))
+    os.makedirs(stage_directory, exist_ok=True)
+
+    #Perfect information bids of all days - computed once (see main_Perfect_Information.py)
+    perfect_information = func.perfect_information_table(case_study, case_data, Time_set, processes)
+    if perfect_information is None:
+        return
+
+    #----------------------------------------
+    # Bids of all days
+    #----------------------------------------
+
+    arguments = [ (case_study, case_data, Time_set, date, policy, stage_directory, cache_filename) for date in dates ]
+
+    if processes is None or processes == 1:
+        outcomes = [ backtest_day(*args) for args in arguments ]
+    else:
+        with Pool(processes) as pool:
+            #Small chunks - finished days are stored while the others are still solved
+            outcomes = pool.starmap(backtest_day, arguments, chunksize=1)
+
+    if any( outcome is None for outcome in outcomes ):
+        return
+
+    #----------------------------------------
+    # Columnar table
+    #----------------------------------------
+
+    rows = [ func.date_index(date) for date in dates ]
+    utilities = np.array([ outcome["utility"] for outcome in outcomes ], dtype=float)
+    max_utilities = np.asarray(perfect_information["utilities"], dtype=float)[rows]
+
+    table = {"dates": np.array(dates, dtype=str),
+             "utilities": utilities,
+             "max_utilities": max_utilities,
+             "captured_share": np.divide(utilities, max_utilities, out=np.full(len(dates), np.nan), where=max_utilities != 0),
+             "accepted": np.array([ outcome["accepted"] for outcome in outcomes ], dtype=int),
+             "surplus": np.array([ outcome["surplus"] for outcome in outcomes ], dtype=float),
+             "runtimes": np.array([ outcome["runtime"] for outcome in outcomes ], dtype=float),
+             "bundles": np.array([ outcome["bundle"] for outcome in outcomes ], dtype=float)}
+
+    #Write table
+    np.savez(filename, key=policy_key(case_study, case_data, Time_set, policy), **table)
+
+    return table
@@ -0,0 +1,113 @@
+"""
+Contains the data structure of a bid, i.e. of a group of atomic bids (x_b, p_b) with bundles x_b and prices p_b.
+
+List of classes:
+    - Bid (atomic bids as a B x T quantity matrix and a price vector of length B)
+"""
+
+#import packages
+import numpy as np
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+class Bid:
+    """
+    Group of atomic bids stored as a B x T quantity matrix (one bundle x_b per row) and a price vector of length B.
+    The arrays are read-only - slicing returns a Bid viewing the same memory (zero-copy), equal bids have the same hash.
+    A self-schedule is a single atomic bid without price (NaN).
+
+    Parameters
+    ----------
+    quantities : list of list or array (B x Time_set)
+        Bundles of the atomic bids. Kept without copy if it is already a float array.
+    prices : None or list or array (length: B)
+        Prices of the atomic bids. If None, the prices are NaN (self-schedule).
+
+    """
+
+    __slots__ = ("quantities", "prices")
+
+    def __init__(self, quantities, prices=None):
+
+        quantities = np.asarray(quantities, dtype=float)
+        if quantities.ndim == 1:
+            quantities = quantities[np.newaxis, :]
+        prices = np.full(len(quantities), np.nan) if prices is None else np.asarray(prices, dtype=float)
+
+        if quantities.ndim != 2 or prices.shape != (len(quantities),):
+            raise ValueError("A bid needs a B x T quantity matrix and B prices, got " + str(quantities.shape) + " and " + str(prices.shape) + ".")
+
+        #Read-only views - the arrays of the caller stay writeable
+        self.quantities = quantities.view()
+        self.prices = prices.view()
+        self.quantities.setflags(write=False)
+        self.prices.setflags(write=False)
+
+    @classmethod
+    def from_dict(cls, bid, Bid_set):
+        """
+        Returns the Bid of a dictionary of atomic bids with keys "x"+str(b) and "p"+str(b) for b in Bid_set.
+        Without "p" keys (self-schedule) the prices are NaN.
+        """
+
+        prices = [ bid["p"+str(b)] for b in Bid_set ] if all( "p"+str(b) in bid for b in Bid_set ) else None
+
+        return cls([ bid["x"+str(b)] for b in Bid_set ], prices)
+
+    def to_dict(self):
+        """
+        Returns the dictionary of atomic bids with keys "x"+str(b) (list) and "p"+str(b) (float).
+        """
+
+        bid = {}
+        for b in range(len(self)):
+            bid.update( {"x"+str(b) : self.quantities[b].tolist()} )
+            bid.update( {"p"+str(b) : float(self.prices[b])} )
+
+        return bid
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Returns the Bid stored in a .npz file (see "save").
+        """
+
+        with np.load(filename) as data:
+            return cls(data["quantities"], data["prices"])
+
+    def save(self, filename):
+        """
+        Stores the bid in an uncompressed .npz file.
+        """
+
+        np.savez(filename, quantities=self.quantities, prices=self.prices)
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def __getitem__(self, index):
+        """
+        Returns the atomic bids selected by index as Bid - a view for integers and slices, a copy for index lists.
+        """
+
+        if isinstance(index, (int, np.integer)):
+            index = slice(index, index + 1 if index != -1 else None)
+
+        return Bid(self.quantities[index], self.prices[index])
+
+    def __eq__(self, other):
+
+        if not isinstance(other, Bid):
+            return NotImplemented
+
+        return (self.quantities.shape == other.quantities.shape and self.quantities.tobytes() == other.quantities.tobytes()
+                and self.prices.tobytes() == other.prices.tobytes())
+
+    def __hash__(self):
+        return hash((self.quantities.shape, self.quantities.tobytes(), self.prices.tobytes()))
+
+    def __repr__(self):
+        return "Bid(" + str(len(self)) + " atomic bids, " + str(self.quantities.shape[1]) + " hours)"
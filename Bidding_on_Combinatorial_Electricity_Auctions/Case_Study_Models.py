@@ -3,15 +3,35 @@ Contains functions that describe the valuations v and feasible sets M of the gen
 
 List of functions:
     - case_data (contains and returns the parameters of the case studies)
+    - case_study_model (returns the optimization model of a case study given its parameters)
+    - model_template (returns a model of a case study which is built once and reused for different prices)
+    - optimize_template (sets the prices of a model template, optionally fixes the bundles, and solves it)
+    - scenario_independent_valuation (checks whether prices only enter the objective via x_tilde, i.e. the valuation does not depend on the scenario)
+    - bundle_valuation (returns the valuations v of fixed bundles, each distinct bundle is valued only once)
+    - bundle_utility (returns the utility v - price * bundle of a fixed bundle for one or many prices)
+    - case_study_valuation (returns the valuations v of a batch of fixed bundles, dispatching to the evaluators below)
+    - template_valuation (returns the valuations v of fixed bundles by solving the model template, used for the flexible load)
+    - thermal_generator_valuation, battery_valuation (return the valuations v of fixed bundles in closed form without a solver)
     - thermal_generator (returns an optimization model defining the thermal generator)
     - battery (returns an optimization model defining the battery)
     - demand_response (returns an optimization model defining the flexible load)
+    - thermal_generator_matrix, battery_matrix, demand_response_matrix (same models as above, built with the matrix API of gurobipy)
 """
 
 #import packages and data
+from collections import OrderedDict
 import gurobipy as gp #makes all Gurobi functions and classes available
 from gurobipy import GRB #makes everything in class GRB available without a prefix (e.g., GRB.OPTIMAL)
 import numpy as np
+import scipy.sparse as sp
+
+#Model templates already built in this process, least recently used first (see model_template)
+_model_templates = OrderedDict()
+_max_model_templates = 32
+
+#Valuations of bundles already determined in this process, least recently used first (see bundle_valuation)
+_bundle_valuations = OrderedDict()
+_max_bundle_valuations = 1000000
 
 
 ##############################################################################################################################################################################################
@@ -97,6 +117,541 @@ def case_data(case_study):
 #--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 ##############################################################################################################################################################################################
 
+def case_study_model(case_study, case_data, Time_set, Scenario_set, Prices, Probabilities, matrix=False):
+    """
+    Reads the parameters of a case study from "case_data" and returns its optimization model.
+
+    Parameters
+    ----------
+    case_study : String 
+        Selects the case study. Possible values: "thermal generator", "battery", "demand response"
+    case_data : List
+        List of parameters necessary to specify the case study (see "case_data"). 
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices. 
+    Scenario_set : list of integers 0,1,2,3, .... S
+        List of scenario indices.
+    Prices : list of list
+        List of prices (length: Time_set) for each scenario in Scenario_set 
+    Probabilities : list of floats
+        List of probability for each scenario in Scenario_set
+    matrix : bool
+        If True, the model is built by the matrix API builders (e.g. "thermal_generator_matrix") - same model, built faster.
+
+    Returns
+    -------
+    gurobi optimization model m (None if the case study is not known)
+
+    """
+    
+    if case_study == "thermal generator":
+        
+        #Read unit characteristics from "case_data"
+        No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost, Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, Max_production_block, Min_up_time, Min_down_time, Initial_operating_state, Initial_off_hours, Initial_on_hours = case_data
+        
+        #Load model
+        builder = thermal_generator_matrix if matrix else thermal_generator
+        m = builder(Time_set, Scenario_set, Prices, Probabilities, No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost, Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, Max_production_block, Min_up_time, Min_down_time, Initial_operating_state, Initial_off_hours, Initial_on_hours)
+        
+    elif case_study == "battery":
+        
+        #Read unit characteristics from "case_data"
+        Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge = case_data
+        
+        #Load model
+        builder = battery_matrix if matrix else battery
+        m = builder(Time_set, Scenario_set, Prices, Probabilities, Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge)
+        
+    elif case_study == "demand response":
+        
+        #Read unit characteristics from "case_data"
+        Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price, Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost = case_data
+        
+        #Load model
+        builder = demand_response_matrix if matrix else demand_response
+        m = builder(Time_set, Scenario_set, Prices, Probabilities, Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price, Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost)
+        
+    else:
+        print("Case study not known.")
+        return
+    
+    m.update()
+    
+    return m
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def model_template(case_study, case_data, Time_set, number_scenarios):
+    """
+    Returns the optimization model of a case study for "number_scenarios" scenarios which is built only once per process
+    (of more than _max_model_templates templates, the least recently used are removed and rebuilt when needed again).
+    Prices only appear in the objective, hence the model is reused for new prices by "optimize_template".
+
+    Parameters
+    ----------
+    case_study : String 
+        Selects the case study. Possible values: "thermal generator", "battery", "demand response"
+    case_data : List
+        List of parameters necessary to specify the case study (see "case_data"). 
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices. 
+    number_scenarios : int >0
+        Number of scenarios of the model
+
+    Returns
+    -------
+    gurobi optimization model m (None if the case study is not known)
+
+    """
+    
+    key = (case_study, repr(case_data), tuple(Time_set), number_scenarios)
+    
+    if key in _model_templates:
+        _model_templates.move_to_end(key)
+    
+    else:
+        
+        #Build model with zero prices - the objective is set by optimize_template
+        Scenario_set = [i for i in range(number_scenarios)]
+        m = case_study_model(case_study, case_data, Time_set, Scenario_set, [[0 for t in Time_set] for s in Scenario_set], [1 for s in Scenario_set], matrix=True)
+        if m is None:
+            return
+        
+        m.Params.LogToConsole = 0
+        
+        #Market variables and original bounds of x_tilde
+        m._x_tilde = [ m.getVarByName("x_tilde"+"["+str(s)+","+str(t)+"]") for s in Scenario_set for t in Time_set ]
+        m._v = [ m.getVarByName("v"+"["+str(s)+"]") for s in Scenario_set ]
+        m._lb = m.getAttr("LB", m._x_tilde)
+        m._ub = m.getAttr("UB", m._x_tilde)
+        
+        _model_templates[key] = m
+        
+        #Remove least recently used templates - callers holding a template keep it alive
+        while len(_model_templates) > _max_model_templates:
+            _model_templates.popitem(last=False)
+    
+    return _model_templates[key]
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def optimize_template(m, Prices, Probabilities, bundles=None, tolerance=1e-6):
+    """
+    Sets the prices of a model template (see "model_template") and solves it, warm-started from the previous solution.
+
+    Parameters
+    ----------
+    m : gurobi optimization model 
+        Model template.
+    Prices : list of list
+        List of prices (length: Time_set) for each scenario of the template
+    Probabilities : list of floats
+        List of probability for each scenario of the template
+    bundles : None or list of list
+        If given, x_tilde of each scenario is fixed to its bundle (length: Time_set).
+    tolerance : float
+        Quantities of the bundles outside the original bounds of x_tilde by at most the tolerance (round-off) are moved onto the bound.
+
+    Returns
+    -------
+    gurobi optimization model m (solved)
+
+    """
+    
+    #Warm start - previous solution as MIP start (LPs keep their basis)
+    start = m.getAttr("X", m.getVars()) if m.IsMIP and m.SolCount > 0 else None
+    
+    #Objective: sum of Probabilities[s] * (v[s] - Prices[s] * x_tilde[s])
+    m.setAttr("Obj", m._v, list(Probabilities))
+    m.setAttr("Obj", m._x_tilde, [ - Probabilities[s] * price for s in range(len(m._v)) for price in Prices[s] ])
+    
+    #Fix bundles or restore original bounds
+    if bundles is None:
+        m.setAttr("LB", m._x_tilde, m._lb)
+        m.setAttr("UB", m._x_tilde, m._ub)
+    else:
+        fixed = np.asarray(bundles, dtype=float).reshape(-1)
+        lb, ub = np.array(m._lb), np.array(m._ub)
+        
+        #Round-off outside the original bounds is clipped - bundles further outside give LB > UB, i.e. an infeasible model
+        fixed = np.where((fixed >= lb - tolerance) & (fixed <= ub + tolerance), np.clip(fixed, lb, ub), fixed)
+        m.setAttr("LB", m._x_tilde, np.maximum(fixed, lb).tolist())
+        m.setAttr("UB", m._x_tilde, np.minimum(fixed, ub).tolist())
+    
+    if start is not None:
+        m.setAttr("Start", m.getVars(), start)
+    
+    m.optimize()
+    
+    return m
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def scenario_independent_valuation(case_study, case_data, Time_set):
+    """
+    Checks whether the valuation v(x) and the feasible set of a bundle do not depend on the price scenario, i.e. whether prices 
+    enter the model template (see "model_template") only by the objective coefficients of x_tilde and no other variable than v 
+    and x_tilde has a cost. Then the expected utility of a common schedule x is v(x) - E[price] * x.
+
+    Parameters
+    ----------
+    case_study : String 
+        Selects the case study. Possible values: "thermal generator", "battery", "demand response"
+    case_data : List
+        List of parameters necessary to specify the case study (see "case_data"). 
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices. 
+
+    Returns
+    -------
+    bool (False if the case study is not known)
+
+    """
+    
+    m = model_template(case_study, case_data, Time_set, 1)
+    if m is None:
+        return False
+    
+    #Objective coefficients of all variables except the market variables x_tilde and the valuation v
+    market = set( var.index for var in m._x_tilde + m._v )
+    costs = [ cost for var, cost in zip(m.getVars(), m.getAttr("Obj", m.getVars())) if var.index not in market ]
+    
+    return not any(costs)
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def bundle_valuation(case_study, case_data, Time_set, bundles):
+    """
+    Returns the valuation v(x) of fixed bundles. The valuation does not depend on the price - each distinct bundle is 
+    valued only once per process (see "case_study_valuation") and looked up afterwards. At most _max_bundle_valuations
+    valuations are kept, the least recently used ones are removed.
+
+    Parameters
+    ----------
+    case_study : String 
+        Selects the case study. Possible values: "thermal generator", "battery", "demand response"
+    case_data : List
+        List of parameters necessary to specify the case study (see "case_data"). 
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices. 
+    bundles : list or array (length: Time_set) or (N x Time_set)
+        Bundle or bundles
+
+    Returns
+    -------
+    Valuation (float) of a single bundle or array of valuations of N bundles. NaN if a bundle is infeasible.
+    None if the case study is not known.
+
+    """
+    
+    single_bundle = np.ndim(bundles) == 1
+    bundles = np.atleast_2d(np.asarray(bundles, dtype=float))
+    
+    keys = [ (case_study, repr(case_data), tuple(Time_set), bundle.tobytes()) for bundle in bundles ]
+    
+    #Look up the bundles seen before
+    known = {}
+    for key in keys:
+        if key in _bundle_valuations:
+            _bundle_valuations.move_to_end(key)
+            known[key] = _bundle_valuations[key]
+    
+    #Value the distinct bundles not seen before in one batch
+    missing = list({ key: i for i, key in enumerate(keys) if key not in known }.values())
+    if missing:
+        solved = case_study_valuation(case_study, case_data, Time_set, bundles[missing])
+        if solved is None:
+            return
+        known.update( (keys[i], valuation) for i, valuation in zip(missing, solved) )
+        _bundle_valuations.update( (keys[i], valuation) for i, valuation in zip(missing, solved) )
+        
+        #Remove least recently used valuations
+        while len(_bundle_valuations) > _max_bundle_valuations:
+            _bundle_valuations.popitem(last=False)
+    
+    valuations = np.array([ known[key] for key in keys ])
+    
+    return valuations[0] if single_bundle else valuations
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def bundle_utility(case_study, case_data, Time_set, bundle, real_prices):
+    """
+    Returns the utility v(x) - price * x of a fixed bundle for one or many prices (e.g., real prices of many days) as dot products.
+
+    Parameters
+    ----------
+    case_study : String 
+        Selects the case study. Possible values: "thermal generator", "battery", "demand response"
+    case_data : List
+        List of parameters necessary to specify the case study (see "case_data"). 
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices. 
+    bundle : list or array (length: Time_set)
+        Traded bundle
+    real_prices : list or array (length: Time_set) or (D x Time_set)
+        Price or prices of D days
+
+    Returns
+    -------
+    Utility (float) for a single price or array of utilities for D days. NaN if the bundle is infeasible.
+
+    """
+    
+    valuation = bundle_valuation(case_study, case_data, Time_set, bundle)
+    if valuation is None:
+        return
+    
+    return valuation - np.asarray(real_prices, dtype=float) @ np.asarray(bundle, dtype=float)
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def case_study_valuation(case_study, case_data, Time_set, bundles):
+    """
+    Returns the valuations v(x) of a batch of fixed bundles without caching (see "bundle_valuation"). 
+    Thermal generator and battery are evaluated in closed form (NumPy), the demand response by its LP.
+
+    Parameters
+    ----------
+    case_study : String 
+        Selects the case study. Possible values: "thermal generator", "battery", "demand response"
+    case_data : List
+        List of parameters necessary to specify the case study (see "case_data"). 
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices. 
+    bundles : array (N x Time_set)
+        Bundles
+
+    Returns
+    -------
+    Array of valuations of the N bundles. NaN if a bundle is infeasible. None if the case study is not known.
+
+    """
+    
+    if case_study == "thermal generator":
+        return thermal_generator_valuation(Time_set, bundles, *case_data)
+    
+    elif case_study == "battery":
+        return battery_valuation(Time_set, bundles, *case_data)
+    
+    elif case_study == "demand response":
+        return template_valuation(case_study, case_data, Time_set, bundles)
+    
+    else:
+        print("Case study not known.")
+        return
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def template_valuation(case_study, case_data, Time_set, bundles, chunk_size=32, tolerance=1e-6):
+    """
+    Returns the valuations v(x) of a batch of fixed bundles by solving the model template (see "model_template") with fixed x_tilde.
+    The bundles are valued in chunks of "chunk_size" scenarios by one solve per chunk - a chunk with an infeasible bundle 
+    is valued bundle by bundle.
+
+    Parameters
+    ----------
+    case_study : String 
+        Selects the case study. Possible values: "thermal generator", "battery", "demand response"
+    case_data : List
+        List of parameters necessary to specify the case study (see "case_data"). 
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices. 
+    bundles : array (N x Time_set)
+        Bundles
+    chunk_size : int >0
+        Number of bundles valued by one solve
+    tolerance : float
+        Bundles violating the bounds of x_tilde by more than "tolerance" are infeasible
+
+    Returns
+    -------
+    Array of valuations of the N bundles. NaN if a bundle is infeasible. None if the case study is not known.
+
+    """
+    
+    bundles = np.atleast_2d(np.asarray(bundles, dtype=float))
+    valuations = np.full(len(bundles), np.nan)
+    
+    #Bundles outside the bounds of x_tilde are infeasible without solving 
+    m = model_template(case_study, case_data, Time_set, 1)
+    if m is None:
+        return
+    within_bounds = np.flatnonzero(np.all( (bundles >= np.array(m._lb) - tolerance) & (bundles <= np.array(m._ub) + tolerance), axis=1))
+    
+    for start in range(0, len(within_bounds), chunk_size):
+        
+        chunk = within_bounds[start : start + chunk_size]
+        
+        #Pad the last chunk with copies of its first bundle - a single template size per chunk size
+        size = min(chunk_size, len(within_bounds))
+        padded = np.concatenate([ chunk, np.repeat(chunk[:1], size - len(chunk)) ])
+        
+        m = model_template(case_study, case_data, Time_set, size)
+        optimize_template(m, np.zeros((size, len(Time_set))).tolist(), [1 for i in range(size)], bundles[padded].tolist(), tolerance)
+        
+        if m.SolCount > 0:
+            valuations[chunk] = m.getAttr("X", m._v)[:len(chunk)]
+        else:
+            #Some bundle of the chunk is infeasible
+            for i in chunk:
+                m = model_template(case_study, case_data, Time_set, 1)
+                optimize_template(m, [[0 for t in Time_set]], [1], [bundles[i].tolist()], tolerance)
+                valuations[i] = m.ObjVal if m.SolCount > 0 else np.nan
+    
+    return valuations
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def thermal_generator_valuation(Time_set, bundles,
+                No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost,
+                Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, 
+                Max_production_block, Min_up_time, Min_down_time, 
+                Initial_operating_state, Initial_off_hours, Initial_on_hours, tolerance=1e-6):
+    """
+    Valuation v(x) of fixed bundles of the thermal generator (see "thermal_generator") without a solver. 
+    A fixed dispatch determines the commitment (on iff producing, as Min_stable_generation > 0), the start-ups and shut-downs,
+    and the block costs (cheapest blocks first). Feasibility of the commitment, ramping and minimum up/down time constraints 
+    is checked for all bundles at once. Time_set has to be the indices 0,1,2,3, ... (constraints are checked by position).
+    See "thermal_generator" for the parameters.
+
+    Parameters
+    ----------
+    bundles : array (N x Time_set)
+        Bundles (negative: power sold)
+    tolerance : float
+        Feasibility tolerance
+
+    Returns
+    -------
+    Array of valuations of the N bundles. NaN if a bundle is infeasible.
+
+    """
+    
+    #Preprocessing data
+    bundles = np.atleast_2d(np.asarray(bundles, dtype=float))
+    T = len(Time_set)
+    Inital_commitment = 0 if Initial_operating_state == 0 else 1 #Initial commitment variable
+    
+    #Production and commitment
+    production = -bundles
+    u = (production > tolerance).astype(float)
+    u_previous = np.hstack([ np.full((len(bundles), 1), Inital_commitment), u[:, :-1] ])
+    
+    #Block costs - blocks are filled in merit order
+    order = np.argsort(Marginal_costs, kind="stable")
+    block_limits = np.array(Max_production_block, dtype=float)[order]
+    block_start = np.concatenate([ [0], np.cumsum(block_limits)[:-1] ])
+    blocks = np.clip(production[:, :, np.newaxis] - block_start, 0, block_limits)
+    
+    valuations = ( - No_load_cost * u.sum(axis=1) 
+                   - Startup_cost * np.maximum(u - u_previous, 0).sum(axis=1) 
+                   - Shutdown_cost * np.maximum(u_previous - u, 0).sum(axis=1) 
+                   - (blocks @ np.array(Marginal_costs, dtype=float)[order]).sum(axis=1) )
+    
+    #Commitment constraints - no consumption, production within [Min_stable_generation, sum of blocks] if on
+    feasible = np.all(production >= -tolerance, axis=1)
+    feasible &= np.all(production <= u * block_limits.sum() + tolerance, axis=1)
+    feasible &= np.all(Min_stable_generation * u <= production + tolerance, axis=1)
+    
+    #Ramping constraints
+    ramp = np.diff(np.hstack([ np.full((len(bundles), 1), Initial_operating_state), production ]), axis=1)
+    feasible &= np.all( (ramp <= Rampup_rate + tolerance) & (ramp >= -Rampdown_rate - tolerance), axis=1)
+    
+    #Inital up- and down time constraints
+    feasible &= np.all(u[:, :Initial_off_hours] == 0, axis=1) & np.all(u[:, :Initial_on_hours] == 1, axis=1)
+    
+    #Minimum-up and -down time constraints (same rows as in "thermal_generator")
+    positions = list(range(T))
+    for t in positions[ Initial_on_hours+1 : -Min_up_time ]:
+        feasible &= Min_up_time * (u[:, t] - u[:, t-1]) <= u[:, t : t + Min_up_time].sum(axis=1)
+    for t in positions[ Initial_on_hours+1 : -Min_down_time ]:
+        feasible &= -Min_down_time * (u[:, t] - u[:, t-1]) <= (1 - u[:, t : t + Min_down_time]).sum(axis=1)
+    if Min_up_time >= 2:
+        for t in positions[ -Min_up_time + 1 : ]:
+            feasible &= u[:, t:].sum(axis=1) - (u[:, t] - u[:, t-1]) >= 0
+    if Min_down_time >= 2:
+        for t in positions[ -Min_down_time + 1 : ]:
+            feasible &= (1 - u[:, t:]).sum(axis=1) - (u[:, t-1] - u[:, t]) >= 0
+    
+    return np.where(feasible, valuations, np.nan)
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def battery_valuation(Time_set, bundles,
+                Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, 
+                Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge, tolerance=1e-6):
+    """
+    Valuation v(x) of fixed bundles of the battery (see "battery") without a solver. Without simultaneous charging and 
+    discharging a fixed net schedule determines charging and discharging, the state-of-charge path is simulated forward 
+    for all bundles at once. See "battery" for the parameters.
+
+    Parameters
+    ----------
+    bundles : array (N x Time_set)
+        Bundles (positive: power bought)
+    tolerance : float
+        Feasibility tolerance
+
+    Returns
+    -------
+    Array of valuations of the N bundles (zero, no degradation costs). NaN if a bundle is infeasible.
+
+    """
+    
+    bundles = np.atleast_2d(np.asarray(bundles, dtype=float))
+    
+    #Charging and discharging
+    g = np.maximum(bundles, 0)
+    d = np.maximum(-bundles, 0)
+    
+    #State-of-charge path
+    e = Initial_StateofCharge + np.cumsum(charging_efficiency * g - d / discharging_efficiency, axis=1)
+    
+    feasible = np.all( (g <= Max_charging + tolerance) & (d <= Max_discharging + tolerance), axis=1)
+    feasible &= np.all( (e >= Min_StateofCharge - tolerance) & (e <= Max_StateofCharge + tolerance), axis=1)
+    feasible &= np.abs(e[:, -1] - Initial_StateofCharge) <= tolerance #end with the same state-of-charge as started
+    
+    return np.where(feasible, 0.0, np.nan)
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
 def thermal_generator(Time_set, Scenario_set, Prices, Probabilities,
                 No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost,
                 Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, 
@@ -400,4 +955,301 @@ def demand_response(Time_set, Scenario_set, Prices, Probabilities,
     m.addConstrs( e[s,0] == (1-Loss_coefficient) * Initial_StateofCharge + g[s,0] - d[s,0]  for s in Scenario_set )
     m.addConstrs( e[s,Time_set[-1]] == Initial_StateofCharge for s in Scenario_set ) #end with the same state-of-charge as started
     
-    return m
\ No newline at end of file
+    return m
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def time_matrix(Time_set, rows):
+    """
+    Returns a coefficient matrix (len(rows) x len(Time_set)) of constraints of a single scenario.
+    Each row is given as a list of (time step, coefficient) pairs. Coefficients of the same time step are added up.
+    """
+    
+    A = np.zeros((len(rows), len(Time_set)))
+    
+    for k, row in enumerate(rows):
+        for t, coefficient in row:
+            A[k, t] += coefficient
+    
+    return A
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def scenario_blocks(number_scenarios, A):
+    """
+    Returns the sparse block-diagonal matrix applying the coefficient matrix A of a single scenario to all scenarios 
+    (variables flattened scenario by scenario, i.e. in the order of x[s,t]).
+    """
+    
+    return sp.kron(sp.identity(number_scenarios, format="csr"), sp.csr_matrix(A), format="csr")
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def thermal_generator_matrix(Time_set, Scenario_set, Prices, Probabilities,
+                No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost,
+                Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, 
+                Max_production_block, Min_up_time, Min_down_time, 
+                Initial_operating_state, Initial_off_hours, Initial_on_hours):
+    """
+    Same optimizaton model as "thermal_generator", built with the matrix API of gurobipy from sparse coefficient matrices 
+    (one call per constraint group instead of one per row). 
+    Scenario_set and Time_set have to be the indices 0,1,2,3, ... (variables are named by position).
+    See "thermal_generator" for the parameters.
+
+    Returns
+    -------
+    gurobi optimization model m
+
+    """
+    
+    #Preprocessing data
+    S, T, Q = len(Scenario_set), len(Time_set), len(Max_production_block)
+    Inital_commitment = 0 if Initial_operating_state == 0 else 1 #Initial commitment variable
+    Price_array = np.array([ Prices[s] for s in Scenario_set ], dtype=float)
+    Probability_array = np.array([ Probabilities[s] for s in Scenario_set ], dtype=float)
+    
+    #Coefficient matrices of a single scenario
+    I_T = np.identity(T)
+    Sum_T = np.ones((1, T)) #sum over hours
+    Difference = I_T[1:] - I_T[:-1] #y[t] - y[t-1] for t >= 1
+    
+    #Create a new model 
+    m = gp.Model("thermal generator") 
+    
+    
+    # 1) Variables (flattened scenario by scenario)
+    
+    ### 1.1) Market variables
+    x_tilde = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = -GRB.INFINITY, name = "x_tilde").reshape(-1) #power sold/produced
+    v = m.addMVar( S, vtype = GRB.CONTINUOUS, lb = -GRB.INFINITY, name = "v") #auxiliary variable for valuation
+    
+    ### 1.2) Production variables
+    p_block = m.addMVar( (S, T, Q), vtype = GRB.CONTINUOUS, ub = 0, lb = -GRB.INFINITY, name = "p_block").reshape(-1) #power produced in generation block /is negative following convention in paper
+    u = m.addMVar( (S, T), vtype = GRB.BINARY, name = "u").reshape(-1) #commitment variable: "on" or "off"
+    
+    ### 1.3) Auxiliary start-up/shut-down cost variables
+    c_up = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = 0, name = "c_up").reshape(-1) #realized start-up costs
+    c_down = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = 0, name = "c_down").reshape(-1) #realized shut-down costs
+    
+    #Sum over blocks: p_block[s,t,:] -> (s,t)
+    Sum_blocks = sp.kron(sp.identity(S * T, format="csr"), np.ones((1, Q)), format="csr")
+    
+    
+    # 2) Objective
+    
+    ### 2.1) Valuation - cost is negative
+    m.addConstr( v == - No_load_cost * (scenario_blocks(S, Sum_T) @ u) - scenario_blocks(S, Sum_T) @ c_up - scenario_blocks(S, Sum_T) @ c_down 
+                + scenario_blocks(S, np.tile(np.array(Marginal_costs, dtype=float), T)[np.newaxis, :]) @ p_block )
+    
+    ### 2.2) Objective function
+    m.setObjective( Probability_array @ v - (Probability_array[:, np.newaxis] * Price_array).reshape(-1) @ x_tilde, GRB.MAXIMIZE)
+    
+    
+    # 3) Constraints
+    
+    ### 3.1) Linking power produced per block to toal power produced
+    m.addConstr( x_tilde == Sum_blocks @ p_block )
+    
+    ### 3.2) Commitment constraints
+    m.addConstr( - p_block - sp.kron(sp.identity(S * T, format="csr"), np.array(Max_production_block, dtype=float)[:, np.newaxis], format="csr") @ u <= 0 )
+    m.addConstr( Min_stable_generation * u + Sum_blocks @ p_block <= 0 )
+    
+    ### 3.3) Ramping constraints
+    m.addConstr( scenario_blocks(S, -Difference) @ x_tilde <= Rampup_rate, name="ramping I")
+    m.addConstr( scenario_blocks(S, -Difference) @ x_tilde >= - Rampdown_rate, name="ramping II" ) 
+    m.addConstr( scenario_blocks(S, -I_T[:1]) @ x_tilde - Initial_operating_state <= Rampup_rate, name="ramping III" ) #Initial operating state is >=0 but x_tilde <= 0
+    m.addConstr( scenario_blocks(S, -I_T[:1]) @ x_tilde - Initial_operating_state >= - Rampdown_rate, name="ramping IV" )     
+    
+    ### 3.4) Cost constraints
+    m.addConstr( scenario_blocks(S, I_T[1:]) @ c_up - Startup_cost * (scenario_blocks(S, Difference) @ u) >= 0 )
+    m.addConstr( scenario_blocks(S, I_T[1:]) @ c_down + Shutdown_cost * (scenario_blocks(S, Difference) @ u) >= 0 )
+    m.addConstr( scenario_blocks(S, I_T[:1]) @ c_up - Startup_cost * (scenario_blocks(S, I_T[:1]) @ u) >= - Inital_commitment * Startup_cost )
+    m.addConstr( scenario_blocks(S, I_T[:1]) @ c_down + Shutdown_cost * (scenario_blocks(S, I_T[:1]) @ u) >= Inital_commitment * Shutdown_cost )  
+    
+    ### 3.5) Inital up- and down time constraints
+    if len(Time_set[0:Initial_off_hours]) > 0:
+        m.addConstr( scenario_blocks(S, time_matrix(Time_set, [[ (t, 1) for t in Time_set[0:Initial_off_hours] ]])) @ u == 0 )
+    if len(Time_set[0:Initial_on_hours]) > 0:
+        m.addConstr( scenario_blocks(S, time_matrix(Time_set, [[ (t, 1) for t in Time_set[0:Initial_on_hours] ]])) @ u == len(Time_set[0:Initial_on_hours]) )
+    
+    ### 3.6) Minimum-up and -down time constraints
+    # Min_up_time * (u[t] - u[t-1]) - sum(u[j] for j in window) <= 0
+    up_times = Time_set[ Initial_on_hours+1 : -Min_up_time ]
+    if len(up_times) > 0:
+        A_up = time_matrix(Time_set, [ [(t, Min_up_time), (t-1, -Min_up_time)] + [(j, -1) for j in Time_set[t : t + Min_up_time]] for t in up_times ])
+        m.addConstr( scenario_blocks(S, A_up) @ u <= 0 )
+    
+    # -Min_down_time * (u[t] - u[t-1]) + sum(u[j] for j in window) <= len(window)
+    down_times = Time_set[ Initial_on_hours+1 : -Min_down_time ]
+    if len(down_times) > 0:
+        A_down = time_matrix(Time_set, [ [(t, -Min_down_time), (t-1, Min_down_time)] + [(j, 1) for j in Time_set[t : t + Min_down_time]] for t in down_times ])
+        m.addConstr( scenario_blocks(S, A_down) @ u <= np.tile([ len(Time_set[t : t + Min_down_time]) for t in down_times ], S) )
+    
+    # sum(u[j] for j >= t) - (u[t] - u[t-1]) >= 0
+    if Min_up_time >= 2:
+        A_end_up = time_matrix(Time_set, [ [(j, 1) for j in Time_set[t:]] + [(t, -1), (t-1, 1)] for t in Time_set[ -Min_up_time + 1 : ] ])
+        m.addConstr( scenario_blocks(S, A_end_up) @ u >= 0 )
+    
+    # -sum(u[j] for j >= t) - u[t-1] + u[t] >= -len(Time_set[t:])
+    if Min_down_time >= 2:   
+        A_end_down = time_matrix(Time_set, [ [(j, -1) for j in Time_set[t:]] + [(t-1, -1), (t, 1)] for t in Time_set[ -Min_down_time + 1 : ] ])
+        m.addConstr( scenario_blocks(S, A_end_down) @ u >= - np.tile([ len(Time_set[t:]) for t in Time_set[ -Min_down_time + 1 : ] ], S) )
+    
+    return m
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def battery_matrix(Time_set, Scenario_set, Prices, Probabilities,
+                Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, 
+                Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge):
+    """
+    Same optimizaton model as "battery", built with the matrix API of gurobipy from sparse coefficient matrices 
+    (one call per constraint group instead of one per row). 
+    Scenario_set and Time_set have to be the indices 0,1,2,3, ... (variables are named by position).
+    See "battery" for the parameters.
+
+    Returns
+    -------
+    gurobi optimization model m
+
+    """
+    
+    #Preprocessing data
+    S, T = len(Scenario_set), len(Time_set)
+    Price_array = np.array([ Prices[s] for s in Scenario_set ], dtype=float)
+    Probability_array = np.array([ Probabilities[s] for s in Scenario_set ], dtype=float)
+    
+    #Coefficient matrices of a single scenario
+    I_T = np.identity(T)
+    Difference = I_T[1:] - I_T[:-1] #y[t] - y[t-1] for t >= 1
+    
+    #Create a new model 
+    m = gp.Model("battery") 
+    
+    
+    # 1) Variables (flattened scenario by scenario)
+    
+    ### 1.1) Market variables
+    x_tilde = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = -GRB.INFINITY, name = "x_tilde").reshape(-1) #power sold/produced
+    v = m.addMVar( S, vtype = GRB.CONTINUOUS, lb = -GRB.INFINITY, name = "v") #auxiliary variable for valuation
+    
+    ### 1.2) Charge/discharge and state-of-charge variables
+    g = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = 0, ub = Max_charging, name = "g").reshape(-1) #power charged
+    d = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = 0, ub = Max_discharging, name = "d").reshape(-1) #power discharged
+    e = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = Min_StateofCharge, ub = Max_StateofCharge, name = "e").reshape(-1) #state-of-charge
+    
+    ### 1.3) Auxiliary variables indicating charging and discharging
+    delta = m.addMVar( (S, T), vtype = GRB.BINARY, name = "delta").reshape(-1) 
+    
+    # 2) Objective
+
+    ### 2.1) Valuation - degradation costs
+    m.addConstr( v == 0 )
+
+    ### 2.2) Objective function
+    m.setObjective( Probability_array @ v - (Probability_array[:, np.newaxis] * Price_array).reshape(-1) @ x_tilde, GRB.MAXIMIZE)
+    
+    # 3) Constraints
+    
+    ### 3.1) Linking x_tilde to charging discharging
+    m.addConstr( x_tilde == g - d )
+    
+    ### 3.2) State of Charge constraints
+    m.addConstr( scenario_blocks(S, Difference) @ e - charging_efficiency * (scenario_blocks(S, I_T[1:]) @ g) + (scenario_blocks(S, I_T[1:]) @ d) / discharging_efficiency == 0 )
+    m.addConstr( scenario_blocks(S, I_T[:1]) @ e - charging_efficiency * (scenario_blocks(S, I_T[:1]) @ g) + (scenario_blocks(S, I_T[:1]) @ d) / discharging_efficiency == Initial_StateofCharge )
+    m.addConstr( scenario_blocks(S, I_T[-1:]) @ e == Initial_StateofCharge ) #end with the same state-of-charge as started
+    
+    ### 3.3) Avoid simultaneous charging&discharging
+    m.addConstr( g - Max_charging * delta <= 0 )    
+    m.addConstr( d + Max_discharging * delta <= Max_discharging )
+   
+    return m
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def demand_response_matrix(Time_set, Scenario_set, Prices, Probabilities,
+                Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price,
+                Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost):
+    """
+    Same optimizaton model as "demand_response", built with the matrix API of gurobipy from sparse coefficient matrices 
+    (one call per constraint group instead of one per row). 
+    Scenario_set and Time_set have to be the indices 0,1,2,3, ... (variables are named by position).
+    See "demand_response" for the parameters.
+
+    Returns
+    -------
+    gurobi optimization model m
+
+    """
+
+    #Preprocessing data
+    S, T = len(Scenario_set), len(Time_set)
+    Price_array = np.array([ Prices[s] for s in Scenario_set ], dtype=float)
+    Probability_array = np.array([ Probabilities[s] for s in Scenario_set ], dtype=float)
+    Heat_Load_array = np.tile([ Heat_Load[t] for t in Time_set ], S).astype(float)
+    
+    #Coefficient matrices of a single scenario
+    I_T = np.identity(T)
+    Sum_T = np.ones((1, T)) #sum over hours
+    
+    #Create a new model 
+    m = gp.Model("demand response") 
+    
+    
+    # 1) Variables (flattened scenario by scenario)
+    
+    ### 1.1) Market variables
+    x_tilde = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = 0, ub = Capacity_Heat_Pump, name = "x_tilde").reshape(-1) #power consumed by the heat pump
+    v = m.addMVar( S, vtype = GRB.CONTINUOUS, lb = -GRB.INFINITY, name = "v") #auxiliary variable for valuation
+    
+    ### 1.2) Charge/discharge and state-of-charge variables of the heat storage
+    g = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = 0, ub = Max_charging_storage, name = "g").reshape(-1) #heat charged
+    d = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = 0, ub = Max_discharging_storage, name = "d").reshape(-1) #heat discharged
+    e = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = 0, ub = Capacity_Storage, name = "e").reshape(-1) #state-of-charge
+    
+    ### 1.3) Gas consumed
+    y = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = 0, ub = Capacity_Gas_Boiler, name = "y").reshape(-1) 
+    
+    ### 1.3) Load curtailed
+    z = m.addMVar( (S, T), vtype = GRB.CONTINUOUS, lb = 0, ub = Heat_Load_array.reshape(S, T), name = "z").reshape(-1) 
+    
+    # 2) Objective
+    
+    ### 2.1) Valuation = revenue by serving load - cost of gas
+    m.addConstr( v + Load_serving_price * (scenario_blocks(S, Sum_T) @ z) + Cost_Gas * (scenario_blocks(S, Sum_T) @ y) == Load_serving_price * sum(Heat_Load[t] for t in Time_set) - Daily_Fixed_cost )
+    
+    ### 2.2) Objective function
+    m.setObjective( Probability_array @ v - (Probability_array[:, np.newaxis] * Price_array).reshape(-1) @ x_tilde, GRB.MAXIMIZE)
+    
+    
+    # 3) Constraints
+    
+    ### 3.1) Load serving constraint
+    m.addConstr( Efficiency_Heat_Pump * x_tilde + Efficiency_Gas_Boiler * y + d - g + z == Heat_Load_array )
+    
+    ### 3.2) State of Charge constraints
+    m.addConstr( scenario_blocks(S, I_T[1:] - (1-Loss_coefficient) * I_T[:-1]) @ e - scenario_blocks(S, I_T[1:]) @ g + scenario_blocks(S, I_T[1:]) @ d == 0 )
+    m.addConstr( scenario_blocks(S, I_T[:1]) @ e - scenario_blocks(S, I_T[:1]) @ g + scenario_blocks(S, I_T[:1]) @ d == (1-Loss_coefficient) * Initial_StateofCharge )
+    m.addConstr( scenario_blocks(S, I_T[-1:]) @ e == Initial_StateofCharge ) #end with the same state-of-charge as started
+    
+    return m
@@ -2,7 +2,18 @@
 Contains functions that define and run the optimization models for bid determination.
 
 List of functions:
+    - unique_rows (distinct rows of a matrix up to a tolerance, used to merge identical price scenarios and bundles)
+    - scenario_valuations (solves the case study for each scenario and returns the optimal bundles and valuations)
+    - single_scenario_valuation (solves the case study for a single price scenario)
+    - profit_matrix (profit of each candidate bundle in each price scenario)
+    - merge_candidates (merges identical candidate bundles and identical price scenarios)
+    - assignment_presolve (removes dominated candidate bundles and unprofitable assignments)
+    - greedy_selection (lazy greedy selection and interchange heuristic for the exclusive group)
+    - lagrangian_selection (Lagrangian relaxation of the exclusive group selection with upper bound)
+    - radius_levels (sorted profit levels of each scenario for the radius formulation of the exclusive group)
+    - reduce_scenarios (reduces the price scenarios of a bid determination to representative scenarios)
     - exclusive_lp (LP with pre-selection of bids to determine exclusive group)
+    - exclusive_linear_sweep (exclusive bids of several sizes from one model)
     - self_schedule (optimization model to determine optimal self-schedule)
 """
 
@@ -10,140 +21,934 @@ List of functions:
 import gurobipy as gp #makes all Gurobi functions and classes available
 from gurobipy import GRB #makes everything in class GRB available without a prefix (e.g., GRB.OPTIMAL)
 import numpy as np
+import heapq
+import time
+import scipy.sparse as sp
 import Case_Study_Models as cs
+import Valuation_Cache as vc
+import Bid_Structure as bs
+import Auxiliary_Functions as func
+from multiprocessing import Pool
 
 ##############################################################################################################################################################################################
 #--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 ##############################################################################################################################################################################################
 
-def exclusive_linear(case_study, case_data, Time_set, Scenario_set, Bid_set, Prices, Probabilities, timelimit):
+def unique_rows(rows, tolerance=1e-6):
     """
-    Determines an exclusive bid by linear program.
+    Finds the distinct rows of a matrix (e.g. price scenarios or bundles). Rows are identical if they agree up to the tolerance,
+    i.e. rows differing by floating-point rounding only are merged. 
+
+    Parameters
+    ----------
+    rows : list of list or array (N x T)
+        Rows
+    tolerance : float
+        Rows are identical if their entries agree up to the tolerance (hashed on a grid of this size).
+
+    Returns
+    -------
+    first : array of int
+        Index of the first occurrence of each distinct row (in original order)
+    inverse : array of int (length: N)
+        Distinct row of each row, i.e. row n is identical to row first[inverse[n]]
+
+    """
+    
+    grid = np.round(np.asarray(rows, dtype=float) / tolerance)
+    first, inverse = np.unique(grid, axis=0, return_index=True, return_inverse=True)[1:]
+    
+    #Number distinct rows by first occurrence
+    order = np.argsort(first)
+    rank = np.empty(len(order), dtype=int)
+    rank[order] = np.arange(len(order))
+    
+    return first[order], rank[inverse.reshape(-1)]
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def scenario_valuations(case_study, case_data, Time_set, Scenario_set, Prices, Probabilities, processes=None, cache=None, tolerance=1e-6):
+    """
+    Solves the case study for each price scenario and returns the optimal bundles and their valuations.
+    These are the candidate bids of the exclusive group (first stage of "exclusive_linear").
+    Identical price scenarios are solved only once.
 
     Parameters
     ----------
     case_study : String 
-        Selects the case study which is run. Possible values: "thermal generator"
+        Selects the case study which is run. Possible values: "thermal generator", "battery", "demand response"
     case_data : List
         List of parameters necessary to specify the case study. 
     Time_set : list of integers 0,1,2,3, ... T
         List of time step indices. 
     Scenario_set : list of integers 0,1,2,3, .... S
         List of scenario indices.
-    Bid_set : list of integers 0,1,2,3, .... B
-        List of bid indices.
     Prices : list of list
         List of prices (length: Time_set) for each scenario in Scenario_set 
     Probabilities : list of floats
         List of probability for each scenario in Scenario_set
-    timelimit : float
-        Sets the runtime limit of gurobi
+    processes : None or int >0
+        If None, all scenarios are solved in one model. 
+        Otherwise, the model is decomposed by scenario (it is separable in scenarios) and each scenario is solved 
+        as its own model by a pool of "processes" worker processes (1: no pool, solved one after the other).
+        The objective values agree with the joint model, the bundles may differ if a scenario has several optimal bundles (ties).
+    cache : None or Valuation_Cache.ValuationCache
+        If given, valuations of known price scenarios are read from the cache and only the others are solved and added to it.
+    tolerance : float
+        Price scenarios are identical if their prices agree up to the tolerance (see "unique_rows").
 
     Returns
     -------
-    exclusive_bid : dictionary
-        Dictionary of atomic bids (quantity and price)
+    bundles : list of lists
+        Optimal bundle (length: Time_set) for each scenario in Scenario_set
+    valuations : list of floats
+        Valuation of the optimal bundle for each scenario in Scenario_set
 
     """
     
-    #----------------------------------------
-    # Loading case study model
-    #----------------------------------------
- 
-    if case_study == "thermal generator":
+    #-----------------------------------------------------
+    # Remove identical price scenarios
+    #-----------------------------------------------------
+    
+    #Scenarios differing by floating-point rounding only (e.g. scenarios tightened to the real price) are identical
+    price_array = np.asarray([ Prices[s] for s in Scenario_set ], dtype=float)
+    first, inverse = unique_rows(price_array, tolerance)
+    unique_prices = price_array[first]
+    
+    #Probability of a unique scenario = sum of probabilities of its duplicates
+    unique_probabilities = np.bincount(inverse, weights=[ Probabilities[s] for s in Scenario_set ], minlength=len(unique_prices))
+    
+    #-----------------------------------------------------
+    # Look up cached valuations
+    #-----------------------------------------------------
+    
+    results = [None for u in range(len(unique_prices))]
+    
+    if cache is not None:
+        keys = [ vc.valuation_key(case_study, case_data, Time_set, price, tolerance) for price in unique_prices ]
+        found = cache.get(keys)
+        results = [ found.get(key) for key in keys ]
+    
+    missing = [ u for u in range(len(unique_prices)) if results[u] is None ]
+    
+    #-----------------------------------------------------
+    # Solve missing scenarios
+    #-----------------------------------------------------
+    
+    if len(missing) > 0:
+    
+        if processes is not None:
+            
+            #Decomposed - one model per scenario with the same objective weight as in the joint model
+            arguments = [ (case_study, case_data, Time_set, unique_prices[u].tolist(), unique_probabilities[u]) for u in missing ]
+            
+            if processes == 1:
+                solved = [ single_scenario_valuation(*args) for args in arguments ]
+            else:
+                with Pool(processes) as pool:
+                    solved = pool.starmap(single_scenario_valuation, arguments, chunksize = max(1, len(arguments) // (4 * processes)))
+            
+            if any(result is None for result in solved):
+                return None, None
         
-        #Read unit characteristics from "case_data"
-        No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost, Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, Max_production_block, Min_up_time, Min_down_time, Initial_operating_state, Initial_off_hours, Initial_on_hours = case_data
+        else:
+            
+            #Joint - all scenarios in one model (template reused for the same number of scenarios)
+            m = cs.model_template(case_study, case_data, Time_set, len(missing))
+            if m is None:
+                return None, None
+            
+            cs.optimize_template(m, unique_prices[missing].tolist(), unique_probabilities[missing].tolist())
+            
+            x_tilde = np.reshape(m.getAttr("X", m._x_tilde), (len(missing), len(Time_set)))
+            solved = [ (x_tilde[i].tolist(), valuation) for i, valuation in enumerate(m.getAttr("X", m._v)) ]
+            
+        for u, result in zip(missing, solved):
+            results[u] = result
         
-        #Load model
-        m = cs.thermal_generator(Time_set, Scenario_set, Prices, Probabilities, No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost, Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, Max_production_block, Min_up_time, Min_down_time, Initial_operating_state, Initial_off_hours, Initial_on_hours)
-        m.update()
+        #Add new valuations to cache
+        if cache is not None:
+            cache.put({ keys[u] : results[u] for u in missing })
+    
+    #-----------------------------------------------------
+    # Map back to scenarios
+    #-----------------------------------------------------
+    
+    bundles = [ list(results[u][0]) for u in inverse ]
+    valuations = [ results[u][1] for u in inverse ]
         
-    elif case_study == "battery":
+    return bundles, valuations
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def single_scenario_valuation(case_study, case_data, Time_set, price, probability=1):
+    """
+    Solves the case study for a single price scenario (worker function of "scenario_valuations").
+
+    Parameters
+    ----------
+    case_study : String 
+        Selects the case study which is run.
+    case_data : List
+        List of parameters necessary to specify the case study. 
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices. 
+    price : list of floats
+        Prices (length: Time_set) of the scenario
+    probability : float
+        Probability of the scenario (weight of the objective)
+
+    Returns
+    -------
+    (bundle, valuation) : tuple of list and float
+        Optimal bundle and its valuation (None if the case study is not known)
+
+    """
+    
+    #Load case study model template - built once per worker process
+    m = cs.model_template(case_study, case_data, Time_set, 1)
+    if m is None:
+        return
+    
+    #Solve case study - one thread per worker process, the template keeps its setting for later solves
+    threads = m.Params.Threads
+    m.Params.Threads = 1
+    cs.optimize_template(m, [price], [probability])
+    m.Params.Threads = threads
+    
+    #Retrieve bundle and valuation
+    bundle = m.getAttr("X", m._x_tilde)
+    valuation = m._v[0].X
+    
+    return bundle, valuation
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def profit_matrix(bundles, valuations, Prices, chunk_size=1024):
+    """
+    Computes the profit of each candidate bundle in each price scenario, i.e., valuations[b] - Prices[s] * bundles[b].
+    The matrix is filled in blocks of scenarios so that the temporary arrays stay small for large numbers of scenarios.
+
+    Parameters
+    ----------
+    bundles : list of list or array (B x T)
+        Candidate bundles
+    valuations : list of floats (length: B)
+        Valuation of each candidate bundle
+    Prices : list of list or array (S x T)
+        Prices for each scenario
+    chunk_size : int >0
+        Number of scenarios per block
+
+    Returns
+    -------
+    profit : array (B x S)
+        Profit of bundle b in scenario s
+
+    """
+    
+    bundles = np.asarray(bundles, dtype=float)
+    valuations = np.asarray(valuations, dtype=float)
+    Prices = np.asarray(Prices, dtype=float)
+    
+    profit = np.empty((len(bundles), len(Prices)))
+    for start in range(0, len(Prices), chunk_size):
+        block = profit[:, start:start+chunk_size]
+        np.matmul(bundles, Prices[start:start+chunk_size].T, out=block)
+        np.subtract(valuations[:, None], block, out=block)
+    
+    return profit
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def merge_candidates(bundles, Prices, Probabilities, tolerance=1e-6, verbose=False):
+    """
+    Merges identical candidate bundles of "exclusive_linear" into one candidate (the valuation of a bundle does not depend on the scenario) 
+    and collapses identical price scenarios into one scenario with the summed probability.
+
+    Parameters
+    ----------
+    bundles : list of list (S x T)
+        Candidate bundles
+    Prices : list of list or array (S x T)
+        Prices for each scenario
+    Probabilities : list of floats
+        Probability of each scenario
+    tolerance : float
+        Bundles (price scenarios) are identical if their quantities (prices) agree up to the tolerance (see "unique_rows").
+    verbose : bool
+        If True, prints how much the model shrank.
+
+    Returns
+    -------
+    unique_bundles : array of int
+        Index of the first occurrence of each distinct bundle
+    unique_prices : array (S' x T)
+        Distinct price scenarios (first occurrence in original order)
+    unique_probabilities : array (S')
+        Summed probabilities of the distinct price scenarios
+
+    """
+    
+    #Distinct bundles - first occurrence in original order
+    unique_bundles = unique_rows(bundles, tolerance)[0]
+    
+    #Distinct price scenarios - probabilities of identical scenarios are summed
+    Prices = np.asarray(Prices, dtype=float)
+    first, inverse = unique_rows(Prices, tolerance)
+    unique_prices = Prices[first]
+    unique_probabilities = np.bincount(inverse, weights=np.asarray(Probabilities, dtype=float), minlength=len(unique_prices))
+    
+    if verbose:
+        print("Merged %d candidate bundles into %d and %d price scenarios into %d." % (len(bundles), len(unique_bundles), len(Prices), len(unique_prices)))
+    
+    return unique_bundles, unique_prices, unique_probabilities
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def assignment_presolve(profit, number_bids, verbose=False):
+    """
+    Reduces the assignment model of "exclusive_linear" before it is built:
+        - A candidate bundle is dominated if another candidate has at least the same profit in every scenario. 
+          It is never needed in an optimal exclusive group and is removed (unless fewer than number_bids candidates remain).
+        - An assignment of scenario s to bundle b with non-positive profit never beats leaving s unassigned and is removed.
+
+    Parameters
+    ----------
+    profit : array (B x S)
+        Profit of candidate bundle b in scenario s (see "profit_matrix")
+    number_bids : int
+        Number of bids of the exclusive group
+    verbose : bool
+        If True, prints how much the model shrank.
+
+    Returns
+    -------
+    candidates : array of int
+        Indices of the remaining candidate bundles
+    pair_bundle : array of int
+        Position in candidates of the bundle of each remaining assignment pair
+    pair_scenario : array of int
+        Scenario of each remaining assignment pair
+
+    """
+    
+    #Only non-negative profits matter - negative ones are never assigned
+    profit = np.maximum(profit, 0)
+    number_candidates, number_scenarios = profit.shape
+    
+    #-----------------------------------------------------
+    # Remove dominated candidate bundles
+    #-----------------------------------------------------
+    
+    #A dominating bundle has at least the same total profit - checking in order of decreasing total profit, 
+    #a bundle only needs to be compared to the non-dominated bundles found so far (equal bundles: lowest index is kept)
+    order = np.argsort(-profit.sum(axis=1), kind="stable")
+    non_dominated = []
+    dominated = []
+    for b in order:
+        if non_dominated and (profit[non_dominated] >= profit[b]).all(axis=1).any():
+            dominated.append(b)
+        else:
+            non_dominated.append(b)
+    
+    #Exclusive group needs number_bids candidates - fill up with dominated bundles 
+    candidates = np.sort(non_dominated + dominated[:max(number_bids - len(non_dominated), 0)])
+    
+    #-----------------------------------------------------
+    # Remove unprofitable assignment pairs
+    #-----------------------------------------------------
+    
+    pair_bundle, pair_scenario = np.nonzero(profit[candidates] > 0)
+    
+    if verbose:
+        print("Presolve removed %d of %d candidate bundles and %d of %d assignment pairs." % (number_candidates - len(candidates), number_candidates, number_candidates * number_scenarios - len(pair_bundle), number_candidates * number_scenarios))
+    
+    return candidates, pair_bundle, pair_scenario
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def greedy_selection(profit, Probabilities, number_bids, initial=None):
+    """
+    Selects the exclusive group heuristically. The expected profit of the best response, i.e., sum_s Probabilities[s] * max(0, max_b profit[b,s]),
+    is a monotone submodular function of the selected bundles (facility location). Bundles are added by lazy greedy selection (priority queue
+    of upper bounds on the marginal gains) and the selection is improved by interchanges (Teitz-Bart) until no swap increases the expected profit.
+
+    Parameters
+    ----------
+    profit : array (B x S)
+        Profit of candidate bundle b in scenario s (see "profit_matrix")
+    Probabilities : list of floats
+        Probability of each scenario
+    number_bids : int
+        Number of selected bundles
+    initial : None or list of int
+        Bundles selected before the greedy selection starts (e.g., the exclusive group of a smaller number of bids)
+
+    Returns
+    -------
+    selected : array of int
+        Sorted indices of the selected candidate bundles
+    value : float
+        Expected profit of the selection
+
+    """
+    
+    profit = np.maximum(profit, 0) #not assigning a scenario yields zero profit
+    Probabilities = np.asarray(Probabilities, dtype=float)
+    
+    #-----------------------------------------------------
+    # Lazy greedy selection
+    #-----------------------------------------------------
+    
+    selected = [] if initial is None else [int(b) for b in initial][:number_bids]
+    best = profit[selected].max(axis=0) if selected else np.zeros(profit.shape[1]) #profit of the best selected bundle in each scenario
+    queue = [ (-gain, b) for b, gain in enumerate(profit @ Probabilities) if b not in selected ] #marginal gains only decrease - old gains are upper bounds
+    heapq.heapify(queue)
+    while len(selected) < number_bids:
+        gain, b = heapq.heappop(queue)
+        gain = Probabilities @ np.maximum(profit[b] - best, 0)
+        if not queue or gain >= -queue[0][0]:
+            selected.append(b)
+            best = np.maximum(best, profit[b])
+        else:
+            heapq.heappush(queue, (-gain, b))
+    value = Probabilities @ best
+    
+    #-----------------------------------------------------
+    # Interchange improvement
+    #-----------------------------------------------------
+    
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(selected)):
+            #Best profit without the i-th bundle and value of replacing it by each candidate
+            others = selected[:i] + selected[i+1:]
+            best_others = profit[others].max(axis=0) if others else np.zeros(profit.shape[1])
+            values = np.maximum(profit, best_others) @ Probabilities
+            b = int(np.argmax(values))
+            if values[b] > value + 1e-9 * max(1, abs(value)):
+                selected[i] = b
+                value = values[b]
+                improved = True
+    
+    return np.sort(selected), value
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def lagrangian_selection(profit, Probabilities, number_bids, iterations=1000, tolerance=1e-6):
+    """
+    Selects the exclusive group by Lagrangian relaxation of the assignment constraints sum_b gamma[b,s] <= 1 (multipliers u[s] >= 0).
+    The relaxed problem decomposes into independent candidates with value c[b] = sum_s max(0, Probabilities[s] * profit[b,s] - u[s]) 
+    and is solved by selecting the number_bids candidates with the highest value. The multipliers are updated by subgradient steps (Polyak step size).
+    Each selection of the relaxed problem is a feasible exclusive group - the best one (starting from "greedy_selection") is returned.
+    
+    Relaxing the cardinality constraint instead does not decompose the problem since the assignment constraints couple the candidates in each scenario.
+
+    Parameters
+    ----------
+    profit : array (B x S)
+        Profit of candidate bundle b in scenario s (see "profit_matrix")
+    Probabilities : list of floats
+        Probability of each scenario
+    number_bids : int
+        Number of selected bundles
+    iterations : int
+        Maximum number of subgradient iterations
+    tolerance : float
+        Relative gap at which the iterations are stopped
+
+    Returns
+    -------
+    selected : array of int
+        Sorted indices of the selected candidate bundles
+    value : float
+        Expected profit of the selection (lower bound)
+    bound : float
+        Lagrangian dual bound (upper bound on the expected profit of any exclusive group)
+
+    """
+    
+    weighted = np.maximum(profit, 0) * np.asarray(Probabilities, dtype=float) #probability weighted profit, negative profits are never assigned
+    
+    #Primal solution of the heuristic
+    selected, value = greedy_selection(profit, Probabilities, number_bids)
+    
+    #Multipliers - initially the best profit in each scenario (bound of selecting all candidates)
+    u = weighted.max(axis=0)
+    bound = np.inf
+    step = 2.0
+    no_improvement = 0
+    
+    for iteration in range(iterations):
         
-        #Read unit characteristics from "case_data"
-        Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge = case_data
+        #Solve relaxed problem - number_bids candidates with highest reduced value
+        reduced = np.maximum(weighted - u, 0)
+        top = np.argpartition(-reduced.sum(axis=1), number_bids - 1)[:number_bids]
+        dual = u.sum() + reduced[top].sum()
         
-        #Load model
-        m = cs.battery(Time_set, Scenario_set, Prices, Probabilities, Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge)
-        m.update() 
+        if bound - dual > 1e-9 * max(1, abs(dual)):
+            no_improvement = 0
+        else:
+            no_improvement = no_improvement + 1
+            if no_improvement >= 20: #halve step size if the bound stalls
+                step = step / 2
+                no_improvement = 0
+        bound = min(bound, dual)
         
-    elif case_study == "demand response":
+        #Relaxed selection is feasible - keep best exclusive group
+        top_value = weighted[top].max(axis=0).sum()
+        if top_value > value:
+            selected, value = np.sort(top), top_value
         
-        #Read unit characteristics from "case_data"
-        Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price, Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost = case_data
+        if bound - value <= tolerance * max(1, abs(bound)) or step < 1e-6:
+            break
         
-        #Load model
-        m = cs.demand_response(Time_set, Scenario_set, Prices, Probabilities, Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price, Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost)
-        m.update()   
+        #Subgradient of the relaxed assignment constraints and projected step
+        subgradient = 1 - (reduced[top] > 0).sum(axis=0)
+        norm = subgradient @ subgradient
+        if norm == 0:
+            break
+        u = np.maximum(u - step * (dual - value) / norm * subgradient, 0)
+    
+    return selected, value, bound
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def radius_levels(profit, number_bids):
+    """
+    Determines the profit levels of the radius formulation (Elloumi) of the exclusive group selection. For each scenario s, the distinct 
+    positive profits D[s,1] < D[s,2] < ... are sorted and z[s,k] indicates that the best selected bundle reaches level D[s,k]:
+        max sum_s Probabilities[s] * sum_k (D[s,k] - D[s,k-1]) * z[s,k]
+        s.t. z[s,k] <= sum_{b: profit[b,s] >= D[s,k]} delta[b],   sum_b delta[b] = number_bids,   0 <= z[s,k] <= 1
+    The size grows with the number of distinct profit levels. Levels that are reached by every selection of number_bids bundles 
+    (profit of at least B - number_bids + 1 bundles) are fixed and not part of the formulation.
+
+    Parameters
+    ----------
+    profit : array (B x S)
+        Profit of candidate bundle b in scenario s (see "profit_matrix")
+    number_bids : int
+        Number of selected bundles
+
+    Returns
+    -------
+    level_scenario : array of int
+        Scenario of each level
+    level_profit : array
+        Profit D[s,k] of each level
+    increment : array
+        Profit increment D[s,k] - D[s,k-1] of each level
+    covering : scipy.sparse.csr_matrix (levels x B)
+        Bundles reaching each level
+    fixed : array (length: S)
+        Highest fixed level of each scenario
+
+    """
+    
+    profit = np.maximum(profit, 0) #not assigning a scenario yields zero profit
+    number_candidates, number_scenarios = profit.shape
+    
+    level_scenario, level_profit, increment, rows, columns = [], [], [], [], []
+    fixed = np.zeros(number_scenarios)
+    number_levels = 0
+    
+    for s in range(number_scenarios):
         
-    else:
-        print("Case study not known.")
+        #Bundles in order of decreasing profit - the bundles reaching a level are a prefix
+        order = np.argsort(-profit[:, s], kind="stable")
+        levels = np.unique(profit[:, s]) 
+        reached = number_candidates - np.searchsorted(profit[order[::-1], s], levels, side="left") #number of bundles reaching each level
+        
+        #Levels reached by at least B - number_bids + 1 bundles are reached by any exclusive group
+        free = reached < number_candidates - number_bids + 1
+        fixed[s] = levels[~free].max()
+        levels, reached = levels[free], reached[free]
+        
+        level_scenario.append(np.full(len(levels), s))
+        level_profit.append(levels)
+        increment.append(np.diff(levels, prepend=fixed[s]))
+        rows.append(np.repeat(np.arange(number_levels, number_levels + len(levels)), reached))
+        columns.append(np.concatenate([order[:n] for n in reached]) if len(levels) else np.zeros(0, dtype=int))
+        number_levels = number_levels + len(levels)
+    
+    rows, columns = np.concatenate(rows), np.concatenate(columns)
+    covering = sp.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(number_levels, number_candidates))
+    
+    return np.concatenate(level_scenario), np.concatenate(level_profit), np.concatenate(increment), covering, fixed
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def reduce_scenarios(Scenario_set, Prices, Probabilities, reduce_to, reduction="forward"):
+    """
+    Reduces the price scenarios of a bid determination to "reduce_to" representative scenarios (see "scenario_reduction").
+
+    Parameters
+    ----------
+    Scenario_set : list of integers 0,1,2,3, .... S
+        List of scenario indices.
+    Prices : list of list
+        List of prices (length: Time_set) for each scenario in Scenario_set 
+    Probabilities : list of floats
+        List of probability for each scenario in Scenario_set
+    reduce_to : None or int >0
+        Number of representative scenarios. If None or not smaller than the number of scenarios, the scenarios are kept.
+    reduction : String
+        Reduction method: "forward" or "k-medoids"
+
+    Returns
+    -------
+    Scenario_set : list of integers
+        Indices 0,1,2, ... of the representative scenarios
+    Prices : list of list
+        Prices of the representative scenarios
+    Probabilities : list of floats
+        Probabilities of the representative scenarios (the probabilities of the scenarios they represent)
+    indices : list of int
+        Position of each representative in the original Scenario_set
+    (None if the reduction method is not known)
+
+    """
+    
+    if reduce_to is None or reduce_to >= len(Scenario_set):
+        return Scenario_set, Prices, Probabilities, [i for i in range(len(Scenario_set))]
+    
+    reduced = func.scenario_reduction([ Prices[s] for s in Scenario_set ], [ Probabilities[s] for s in Scenario_set ], reduce_to, reduction)
+    if reduced is None:
+        return
+    indices, probabilities, distance = reduced
+    
+    print("Reduced %d price scenarios to %d, wasserstein distance %e." % (len(Scenario_set), len(indices), distance))
+    
+    return [i for i in range(len(indices))], [ list(Prices[Scenario_set[i]]) for i in indices ], probabilities.tolist(), indices.tolist()
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def exclusive_linear(case_study, case_data, Time_set, Scenario_set, Bid_set, Prices, Probabilities, timelimit, processes=None, cache=None, presolve=True, tolerance=1e-6, engine="mip", mip_start=True, formulation="assignment", linking="full", scenario_solutions=None, reduce_to=None, reduction="forward"):
+    """
+    Determines an exclusive bid by linear program.
+
+    Parameters
+    ----------
+    case_study : String 
+        Selects the case study which is run. Possible values: "thermal generator"
+    case_data : List
+        List of parameters necessary to specify the case study. 
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices. 
+    Scenario_set : list of integers 0,1,2,3, .... S
+        List of scenario indices.
+    Bid_set : list of integers 0,1,2,3, .... B
+        List of bid indices.
+    Prices : list of list
+        List of prices (length: Time_set) for each scenario in Scenario_set 
+    Probabilities : list of floats
+        List of probability for each scenario in Scenario_set
+    timelimit : float
+        Sets the runtime limit of gurobi
+    processes : None or int >0
+        Number of worker processes solving the scenarios of the case study separately (see "scenario_valuations").
+        If None, all scenarios are solved in one model.
+    cache : None or Valuation_Cache.ValuationCache
+        Persistent cache of scenario valuations (see "scenario_valuations").
+    presolve : bool
+        If True, identical candidate bundles and price scenarios are merged (see "merge_candidates") and dominated candidate bundles 
+        and unprofitable assignments are removed (see "assignment_presolve") before the model is built.
+    tolerance : float
+        Candidate bundles (price scenarios) are identical if their quantities (prices) agree up to the tolerance (see "unique_rows").
+    engine : String
+        Solver of the selection problem: "mip" (assignment model solved by gurobi), "greedy" (see "greedy_selection") 
+        or "lagrangian" (see "lagrangian_selection", prints the upper bound and the gap)
+    mip_start : bool
+        If True, the assignment model starts from the solution of "greedy_selection".
+    formulation : String
+        Formulation of the engine "mip": "assignment" (binaries gamma[b,s] assign scenarios to bundles) 
+        or "radius" (variables z[s,k] indicate that profit level k of scenario s is reached, see "radius_levels")
+    linking : String
+        Linking constraints of the formulation "assignment": "full" (gamma[b,s] <= delta[b] for all pairs) or "lazy" (one aggregated 
+        constraint per bundle, disaggregated constraints are only added if violated by the LP relaxation)
+    scenario_solutions : None or tuple of lists
+        Bundles and valuations of the scenarios as returned by "scenario_valuations" (e.g., the prefix of the solutions of a larger, 
+        nested scenario set). If None, the case study is solved for each scenario.
+    reduce_to : None or int >0
+        If given, the scenarios are reduced to "reduce_to" representative scenarios with the probabilities of the scenarios they represent 
+        before the case study is solved (see "reduce_scenarios"), e.g. to bid on a large scenario set.
+    reduction : String
+        Reduction method of "reduce_to": "forward" or "k-medoids" (see "scenario_reduction")
+
+    Returns
+    -------
+    exclusive_bid : Bid
+        Atomic bids (quantities and prices, see "Bid"). Empty if no bundle is selected.
+    runtime : float
+        Runtime of the selection (see "exclusive_linear_sweep")
+
+    """
+    
+    results = exclusive_linear_sweep(case_study, case_data, Time_set, Scenario_set, [len(Bid_set)], Prices, Probabilities, timelimit, processes, cache, presolve, tolerance, engine, mip_start, formulation, linking, scenario_solutions, reduce_to, reduction)
+    if results is None:
         return
     
+    return results[0]
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+def exclusive_linear_sweep(case_study, case_data, Time_set, Scenario_set, bid_sizes, Prices, Probabilities, timelimit, processes=None, cache=None, presolve=True, tolerance=1e-6, engine="mip", mip_start=True, formulation="assignment", linking="full", scenario_solutions=None, reduce_to=None, reduction="forward"):
+    """
+    Determines exclusive bids of several sizes for the same scenarios (see "exclusive_linear" for the parameters). The case study is solved 
+    and the model of the engine "mip" is built once - for each bid size only the right-hand side of the cardinality constraint is changed
+    and the model is warm-started from the exclusive group of the previous bid size.
+
+    Parameters
+    ----------
+    bid_sizes : list of int
+        Number of bids of each exclusive bid (the remaining parameters are the ones of "exclusive_linear")
+
+    Returns
+    -------
+    results : list of tuple
+        Exclusive bid (Bid of atomic bids) and runtime for each bid size
+
+    """
+    
     #-----------------------------------------------------
-    # Solve case study and retrieve bundles and valuations
+    # Reduce scenarios to representatives
     #-----------------------------------------------------
-    m.Params.LogToConsole = 0 #gurobi log output: 0(no), 1(yes) 
-    m.optimize()
     
-    bundles = []
-    valuations = []
+    reduced = reduce_scenarios(Scenario_set, Prices, Probabilities, reduce_to, reduction)
+    if reduced is None:
+        return
+    Scenario_set, Prices, Probabilities, indices = reduced
+    if scenario_solutions is not None:
+        scenario_solutions = ([ scenario_solutions[0][i] for i in indices ], [ scenario_solutions[1][i] for i in indices ])
     
-    for s in Scenario_set :
-        bundles.append( [ m.getVarByName("x_tilde"+"["+str(s)+","+str(t)+"]").X for t in Time_set ] )
-        valuations.append( m.getVarByName("v"+"["+str(s)+"]").X )
+    #-----------------------------------------------------
+    # Solve case study and retrieve bundles and valuations
+    #-----------------------------------------------------
+    
+    if scenario_solutions is None:
+        bundles, valuations = scenario_valuations(case_study, case_data, Time_set, Scenario_set, Prices, Probabilities, processes, cache, tolerance)
+    else:
+        bundles, valuations = scenario_solutions
+    if bundles is None:
+        return
 
     #-------------------------------------------
     # Create optimization model
     #-------------------------------------------
 
-    #Create a new model 
-    m = gp.Model("exclusive - linear") 
+    #Merge identical candidate bundles and price scenarios
+    if presolve:
+        unique_bundles, Prices, Probabilities = merge_candidates(bundles, Prices, Probabilities, tolerance)
+    else:
+        unique_bundles = np.arange(len(Scenario_set))
     
-    # 1) Create binary variables
-    delta = m.addVars(Scenario_set, vtype = GRB.BINARY, name = "delta") 
-    gamma = m.addVars(Scenario_set, Scenario_set, vtype = GRB.BINARY, name = "gamma") 
+    #Profit of each candidate bundle b in each scenario s - one matrix product instead of S*S*T terms
+    profit = profit_matrix([bundles[b] for b in unique_bundles], [valuations[b] for b in unique_bundles], Prices)
     
-    # Binaries could be relaxed to continuous with [0,1] bounds - we let integer program be solved at root node of branch&bound
-    # This ensures that always a vertex solution is chosen and not, if the LP has infinitely many solutions, one in between two vertices.
+    #Candidate bundles and assignment pairs (b,s) - pair_bundle is the position in candidates
+    number_scenarios = len(Probabilities)
+    if presolve:
+        candidates, pair_bundle, pair_scenario = assignment_presolve(profit, max(bid_sizes))
+    else:
+        candidates = np.arange(number_scenarios)
+        pair_bundle = np.repeat(np.arange(number_scenarios), number_scenarios)
+        pair_scenario = np.tile(np.arange(number_scenarios), number_scenarios)
     
-    # 2) Create constraints
-    m.addConstrs( sum (gamma[b,s] for b in Scenario_set)  <= 1 for s in Scenario_set)
-    m.addConstrs( gamma[b,s] <= delta[b] for s in Scenario_set for b in Scenario_set)
-    m.addConstr( sum( delta[b] for b in Scenario_set) == len(Bid_set) )
+    Probabilities = np.asarray(Probabilities, dtype=float)
     
-    # 3) Set objective
-    m.setObjective( sum(Probabilities[s] * sum ( (valuations[b] - sum(Prices[s][t] * bundles[b][t] for t in Time_set)) * gamma[b,s] for b in Scenario_set)  for s in Scenario_set), GRB.MAXIMIZE)
+    if engine == "mip":
     
-    #------------------------
-    # Determine atomic bids
-    #------------------------
-    m.Params.LogToConsole = 1 #gurobi log output: 0(no), 1(yes) 
-    m.setParam('TimeLimit', timelimit) 
-    m.setParam('NodeLimit', 1) #avoid starting branch-and-bound due to numerical inaccuracies, go with the found solution.
-    m.optimize()
+        #Create a new model 
+        m = gp.Model("exclusive - linear") 
+        m.ModelSense = GRB.MAXIMIZE
+        
+        # 1) Create binary variables
+        delta = m.addMVar(len(candidates), vtype = GRB.BINARY, name = "delta") 
+        
+        # Binaries could be relaxed to continuous with [0,1] bounds - we let integer program be solved at root node of branch&bound
+        # This ensures that always a vertex solution is chosen and not, if the LP has infinitely many solutions, one in between two vertices.
+        
+        if formulation == "assignment":
+            
+            # 2) Create assignment variables - objective coefficients are the probability weighted profits
+            gamma = m.addMVar(len(pair_bundle), vtype = GRB.BINARY, obj = Probabilities[pair_scenario] * profit[candidates[pair_bundle], pair_scenario], name = "gamma") 
+            
+            # 3) Create constraints
+            pairs = np.arange(len(pair_bundle))
+            assignment = sp.csr_matrix((np.ones(len(pairs)), (pair_scenario, pairs)), shape=(number_scenarios, len(pairs))) #each scenario is assigned to at most one bundle
+            selection = sp.csr_matrix((np.ones(len(pairs)), (pairs, pair_bundle)), shape=(len(pairs), len(candidates))) #only selected bundles can be assigned
+            m.addConstr( assignment @ gamma <= 1 )
+            
+            if linking == "full":
+                m.addConstr( gamma - selection @ delta <= 0 )
+                
+            elif linking == "lazy":
+                #Aggregated linking constraint per bundle - exact for binary delta, but weaker LP relaxation
+                #Disaggregated linking constraints are added below if violated by the LP relaxation
+                m.addConstr( selection.T @ gamma - sp.diags(selection.sum(axis=0).A1) @ delta <= 0 )
+                number_linking = 0
+                
+            else:
+                print("Linking not known.")
+                return
+            
+        elif formulation == "radius":
+            
+            # 2) Create level variables - objective coefficients are the probability weighted profit increments between levels
+            #Fixed levels of the smallest bid size are reached by any exclusive group of the larger bid sizes as well
+            level_scenario, level_profit, increment, covering, fixed = radius_levels(profit[candidates], min(min(bid_sizes), len(candidates)))
+            z = m.addMVar(len(level_scenario), ub = 1, obj = Probabilities[level_scenario] * increment, name = "z") 
+            m.ObjCon = Probabilities @ fixed #levels reached by any exclusive group
+            
+            # 3) Create constraints - level can only be reached if a selected bundle reaches it
+            m.addConstr( z - covering @ delta <= 0 )
+            
+        else:
+            print("Formulation not known.")
+            return
+        
+        # 4) Cardinality constraint - right-hand side is set for each bid size
+        cardinality = m.addConstr( delta.sum() == 0 )
+        
+        m.Params.LogToConsole = 1 #gurobi log output: 0(no), 1(yes) 
+        m.setParam('TimeLimit', timelimit) 
+        m.setParam('NodeLimit', 1) #avoid starting branch-and-bound due to numerical inaccuracies, go with the found solution.
+        
+    elif engine not in ["greedy", "lagrangian"]:
+        print("Engine not known.")
+        return
     
-    #--------------------------
-    # Convert solution to bids
-    #-------------------------
-
-    exclusive_bid = {}
-    b = 0
-    for s in Scenario_set:
-        if delta[s].X < 1.01 and delta[s].X > 0.99 : #bid selected? - account for numerical rounding errors - 1 is not always 1 but sometimes 0.9995 or so
-            exclusive_bid.update( {"x"+str(b) : bundles[s]} )
-            exclusive_bid.update( {"p"+str(b) : valuations[s]} )
-            b = b+1   
+    #-----------------------------------------------------
+    # Iterating over bid sizes
+    #-----------------------------------------------------
     
-    return exclusive_bid, m.Runtime
-
+    results = []
+    selected = None #exclusive group of the previous bid size
+    
+    for size_bid in bid_sizes:
+        
+        number_bids = min(size_bid, len(candidates)) #less distinct candidate bundles than bids: all are selected
+        
+        if engine == "greedy":
+            
+            #------------------------
+            # Determine atomic bids
+            #------------------------
+            start_time = time.time()
+            selected, value = greedy_selection(profit[candidates], Probabilities, number_bids)
+            runtime = time.time() - start_time
+            
+        elif engine == "lagrangian":
+            
+            #------------------------
+            # Determine atomic bids
+            #------------------------
+            start_time = time.time()
+            selected, value, bound = lagrangian_selection(profit[candidates], Probabilities, number_bids)
+            runtime = time.time() - start_time
+            print("Best objective %e, best bound %e, gap %.4f%%" % (value, bound, 100 * max(bound - value, 0) / max(abs(bound), 1e-10)))
+            
+        else:
+            
+            cardinality.RHS = number_bids
+            runtime = 0 #runtime of cutting planes
+            
+            #Cutting planes - add disaggregated linking constraints violated by the LP relaxation until none is violated
+            if formulation == "assignment" and linking == "lazy":
+                delta.VType, gamma.VType = GRB.CONTINUOUS, GRB.CONTINUOUS
+                while True:
+                    m.optimize()
+                    runtime = runtime + m.Runtime
+                    violated = np.nonzero(gamma.X - delta.X[pair_bundle] > 1e-6)[0]
+                    if len(violated) == 0:
+                        break
+                    m.addConstr( gamma[violated] - selection[violated] @ delta <= 0 )
+                    number_linking = number_linking + len(violated)
+                delta.VType, gamma.VType = GRB.BINARY, GRB.BINARY
+                print("Added %d of %d linking constraints." % (number_linking, len(pairs)))
+            
+            #MIP start - greedy exclusive group or extension of the one of the previous bid size (the better one), each scenario assigned to its most profitable selected bundle
+            if mip_start:
+                starts = [ greedy_selection(profit[candidates], Probabilities, number_bids, initial) for initial in ([None] if selected is None else [None, selected]) ]
+                selected, value = max(starts, key=lambda start: start[1])
+                delta.Start = np.isin(np.arange(len(candidates)), selected)
+                if formulation == "assignment":
+                    best = selected[np.argmax(profit[candidates[selected]], axis=0)]
+                    gamma.Start = (best[pair_scenario] == pair_bundle) & (profit[candidates[pair_bundle], pair_scenario] > 0)
+                else:
+                    z.Start = profit[candidates[selected]].max(axis=0)[level_scenario] >= level_profit
+            
+            #------------------------
+            # Determine atomic bids
+            #------------------------
+            m.optimize()
+            
+            if m.SolCount > 0:
+                selected = np.nonzero((delta.X < 1.01) & (delta.X > 0.99))[0] #bid selected? - account for numerical rounding errors - 1 is not always 1 but sometimes 0.9995 or so
+            else:
+                selected = np.array([], dtype=int) #no solution within the limits
+            runtime = runtime + m.Runtime
+        
+        #--------------------------
+        # Convert solution to bids
+        #-------------------------
+    
+        rows = unique_bundles[candidates[selected]]
+        
+        if len(rows) == 0:
+            #No bundle selected (e.g. node or time limit without solution) - empty exclusive group, never accepted
+            print("No atomic bid selected.")
+            exclusive_bid = bs.Bid(np.empty((0, len(Time_set))), np.empty(0))
+        else:
+            #Less distinct candidate bundles than bids - exclusive group is filled up with duplicates
+            rows = rows[np.arange(size_bid) % len(rows)]
+            exclusive_bid = bs.Bid([ bundles[s] for s in rows ], [ valuations[s] for s in rows ])
+        
+        results.append( (exclusive_bid, runtime) )
+    
+    return results
 
 ##############################################################################################################################################################################################
 #--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 ##############################################################################################################################################################################################
 
-def self_schedule(case_study, case_data, Time_set, Scenario_set, Prices, Probabilities, timelimit, real_price):
+def self_schedule(case_study, case_data, Time_set, Scenario_set, Prices, Probabilities, timelimit, real_price, coupling="pairwise", collapse=False, verify=False, reduce_to=None, reduction="forward"):
     """
     Determines a self-schedule.
 
@@ -165,117 +970,115 @@ def self_schedule(case_study, case_data, Time_set, Scenario_set, Prices, Probabi
         Sets the runtime limit of gurobi
     real_price : list
         Real ex post electrcity price
+    coupling : String
+        Formulation of the scenario coupling (non-anticipativity) constraints. Possible values:
+        "pairwise" (x_tilde[s1,t] == x_tilde[s2,t] for all pairs of scenarios, O(T*S^2) rows)
+        "first-stage" (one schedule variable per hour linked to each scenario once, O(T*S) rows)
+    collapse : bool
+        If True and the valuation does not depend on the scenario (see "scenario_independent_valuation"), the self-schedule is determined
+        by a single scenario with the expected price instead of the coupled model of all scenarios - "coupling" is then only used by "verify".
+    verify : bool
+        If True, the coupled model (formulation "coupling") is solved in addition and its objective value is compared to the collapsed one.
+    reduce_to : None or int >0
+        If given, the scenarios are reduced to "reduce_to" representative scenarios first (see "reduce_scenarios").
+    reduction : String
+        Reduction method of "reduce_to": "forward" or "k-medoids" (see "scenario_reduction")
 
     Returns
     -------
-    self schedule : list
-        A bundle of power bough/sold
+    self schedule : Bid
+        A single atomic bid (bundle of power bough/sold) without price, see "Bid"
     utility : float
         Utility of that bundle
 
     """
     
     #----------------------------------------
-    # Loading case study model
+    # Reduce scenarios to representatives
     #----------------------------------------
- 
-    if case_study == "thermal generator":
-        
-        #Read unit characteristics from "case_data"
-        No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost, Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, Max_production_block, Min_up_time, Min_down_time, Initial_operating_state, Initial_off_hours, Initial_on_hours = case_data
-        
-        #Load model
-        m = cs.thermal_generator(Time_set, Scenario_set, Prices, Probabilities, No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost, Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, Max_production_block, Min_up_time, Min_down_time, Initial_operating_state, Initial_off_hours, Initial_on_hours)
-        m.update()
-        
-    elif case_study == "battery":
-        
-        #Read unit characteristics from "case_data"
-        Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge = case_data
-        
-        #Load model
-        m = cs.battery(Time_set, Scenario_set, Prices, Probabilities, Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge)
-        m.update() 
-        
-    elif case_study == "demand response":
-        
-        #Read unit characteristics from "case_data"
-        Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price, Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost = case_data
-        
-        #Load model
-        m = cs.demand_response(Time_set, Scenario_set, Prices, Probabilities, Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price, Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost)
-        m.update()   
-        
-    else:
-        print("Case study not known.")
-        return
-
-
-    #-------------------------------------------
-    # Add Scenario coupling constraint
-    #-------------------------------------------
-    
-    m.addConstrs( m.getVarByName("x_tilde"+"["+str(s1)+","+str(t)+"]") == m.getVarByName("x_tilde"+"["+str(s2)+","+str(t)+"]") for t in Time_set for s1 in Scenario_set for s2 in Scenario_set)
     
-    #------------------------
-    # Determine schedule
-    #------------------------
-    m.Params.LogToConsole = 1 #gurobi log output: 0(no), 1(yes) 
-    m.setParam('TimeLimit', timelimit) 
-    m.optimize()
+    reduced = reduce_scenarios(Scenario_set, Prices, Probabilities, reduce_to, reduction)
+    if reduced is None:
+        return
+    Scenario_set, Prices, Probabilities, indices = reduced
     
-    self_dispatch = [m.getVarByName("x_tilde"+"["+str(1)+","+str(t)+"]").X for t in Time_set]
-        
     #----------------------------------------
-    # Determine utility gained by traded bundle
+    # Expected-price collapse
     #----------------------------------------
     
-    #Setting Scenarios to perfect information
-    Scenario_set = [0]
-    Probabilities = [1]
-    Prices = [real_price]
- 
-    #Load case study model
-    if case_study == "thermal generator":
-        
-        #Read unit characteristics from "case_data"
-        No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost, Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, Max_production_block, Min_up_time, Min_down_time, Initial_operating_state, Initial_off_hours, Initial_on_hours = case_data
+    #If prices only enter the objective via x_tilde, the valuation of a bundle does not depend on the scenario.
+    #For a common schedule x the expected objective is thus v(x) - E[price] * x, i.e. a single scenario with the expected price.
+    collapsed = collapse and cs.scenario_independent_valuation(case_study, case_data, Time_set)
+    
+    if collapse and not collapsed:
+        print("Expected-price collapse not possible, the coupled model is solved.")
+    elif collapsed and coupling != "pairwise" and not verify:
+        print("Expected-price collapse - coupling " + coupling + " is not used.")
+    
+    if collapsed:
         
-        #Load model
-        m = cs.thermal_generator(Time_set, Scenario_set, Prices, Probabilities, No_load_cost, Marginal_costs, Startup_cost, Shutdown_cost, Rampup_rate, Rampdown_rate, Min_stable_generation, Max_production_limit, Max_production_block, Min_up_time, Min_down_time, Initial_operating_state, Initial_off_hours, Initial_on_hours)
-        m.update()
+        total_probability = sum(Probabilities[s] for s in Scenario_set)
+        expected_price = sum(Probabilities[s] * np.array(Prices[s], dtype=float) for s in Scenario_set) / total_probability
         
-    elif case_study == "battery":
+        #Solve single-scenario model template - same objective value as the coupled model
+        m = cs.model_template(case_study, case_data, Time_set, 1)
+        m.setParam('TimeLimit', timelimit) 
+        cs.optimize_template(m, [expected_price.tolist()], [total_probability])
+        m.setParam('TimeLimit', GRB.INFINITY) 
         
-        #Read unit characteristics from "case_data"
-        Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge = case_data
+        self_dispatch = m.getAttr("X", m._x_tilde)
+        expected_utility = m.ObjVal
+    
+    if not collapsed or verify:
+    
+        #----------------------------------------
+        # Loading case study model
+        #----------------------------------------
         
-        #Load model
-        m = cs.battery(Time_set, Scenario_set, Prices, Probabilities, Max_charging, Max_discharging, charging_efficiency, discharging_efficiency, Min_StateofCharge, Max_StateofCharge, Initial_StateofCharge)
-        m.update()  
+        #New model - coupling constraints are added below, so the model template is not used
+        m = cs.case_study_model(case_study, case_data, Time_set, Scenario_set, Prices, Probabilities, matrix=True)
+        if m is None:
+            return
+    
+        #-------------------------------------------
+        # Add Scenario coupling constraint
+        #-------------------------------------------
         
-    elif case_study == "demand response":
+        if coupling == "pairwise":
+            m.addConstrs( m.getVarByName("x_tilde"+"["+str(s1)+","+str(t)+"]") == m.getVarByName("x_tilde"+"["+str(s2)+","+str(t)+"]") for t in Time_set for s1 in Scenario_set for s2 in Scenario_set)
+            
+        elif coupling == "first-stage":
+            x_first = m.addVars( Time_set, vtype = GRB.CONTINUOUS, lb = -GRB.INFINITY, name = "x_first") #common schedule of all scenarios
+            m.addConstrs( m.getVarByName("x_tilde"+"["+str(s)+","+str(t)+"]") == x_first[t] for t in Time_set for s in Scenario_set)
+            
+        else:
+            print("Coupling not known.")
+            return
         
-        #Read unit characteristics from "case_data"
-        Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price, Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost = case_data
+        #------------------------
+        # Determine schedule
+        #------------------------
+        m.Params.LogToConsole = 1 #gurobi log output: 0(no), 1(yes) 
+        m.setParam('TimeLimit', timelimit) 
+        m.optimize()
         
-        #Load model
-        m = cs.demand_response(Time_set, Scenario_set, Prices, Probabilities, Efficiency_Heat_Pump, Efficiency_Gas_Boiler, Loss_coefficient, Heat_Load, Cost_Gas, Load_serving_price, Capacity_Storage, Max_charging_storage, Max_discharging_storage, Capacity_Heat_Pump, Capacity_Gas_Boiler, Initial_StateofCharge, Daily_Fixed_cost)
-        m.update()    
+        if collapsed: #verify collapse - objective values have to agree up to the MIP gap
+            if abs(m.ObjVal - expected_utility) > max(m.Params.MIPGap, 1e-6) * max(1, abs(m.ObjVal)):
+                print("Expected-price collapse not verified: ", expected_utility, " vs. ", m.ObjVal)
+        elif coupling == "pairwise":
+            self_dispatch = [m.getVarByName("x_tilde"+"["+str(Scenario_set[0])+","+str(t)+"]").X for t in Time_set] #all scenarios have the same schedule
+        else:
+            self_dispatch = [x_first[t].X for t in Time_set]
         
-    else:
-        print("Case study not known.")
-        return
-    
-    #Fix bundle to certain value
-    m.addConstrs( m.getVarByName("x_tilde"+"["+str(s)+","+str(t)+"]") == self_dispatch[t]  for t in Time_set for s in Scenario_set )
+    #----------------------------------------
+    # Determine utility gained by traded bundle
+    #----------------------------------------
     
-    #Solve model and retrieve utility
+    #Valuation of the bundle is determined once - utility is a dot product with the real price
+    utility = cs.bundle_utility(case_study, case_data, Time_set, self_dispatch, real_price)
     
-    m.Params.LogToConsole = 0
-    m.optimize()
-
-    if m.SolCount > 0: #model has found a solution - bundle is feasible
-        utility = m.ObjVal  
+    if np.isnan(utility): #bundle is infeasible
+        utility = -1
+        print("Bundle infeasible")
     
-    return self_dispatch, utility
\ No newline at end of file
+    return bs.Bid(self_dispatch), utility
\ No newline at end of file
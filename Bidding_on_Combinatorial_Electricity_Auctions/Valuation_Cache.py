@@ -0,0 +1,170 @@
+"""
+Contains a persistent cache of scenario valuations, i.e. of the optimal bundle x_tilde and its valuation v 
+of a case study given a price scenario. Lets repeated runs skip solving the case study for known price scenarios.
+
+List of classes:
+    - ValuationCache (disk-backed cache (SQLite) of bundles and valuations with a least-recently-used size cap)
+    
+List of functions:
+    - valuation_key (content hash of case study, case data, time set and price scenario)
+"""
+
+#import packages
+import contextlib
+import hashlib
+import sqlite3
+import time
+import numpy as np
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+def valuation_key(case_study, case_data, Time_set, price, tolerance=1e-6):
+    """
+    Computes the content hash identifying a scenario valuation. Prices are hashed on a grid of size tolerance, 
+    i.e. price scenarios differing by floating-point rounding only have the same key (as in "unique_rows").
+
+    Parameters
+    ----------
+    case_study : String 
+        Selects the case study.
+    case_data : List
+        List of parameters necessary to specify the case study. 
+    Time_set : list of integers 0,1,2,3, ... T
+        List of time step indices. 
+    price : list of floats
+        Prices (length: Time_set) of the scenario
+    tolerance : float
+        Grid size of the prices
+
+    Returns
+    -------
+    key : String
+        SHA-256 hex digest
+
+    """
+    
+    h = hashlib.sha256()
+    h.update(repr((case_study, case_data, list(Time_set))).encode())
+    
+    #Grid points of the prices (+ 0.0 turns -0.0 into 0.0)
+    h.update((np.round(np.asarray(price, dtype=float) / tolerance) + 0.0).tobytes())
+    
+    return h.hexdigest()
+
+
+##############################################################################################################################################################################################
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+##############################################################################################################################################################################################
+
+
+class ValuationCache:
+    """
+    Disk-backed cache of scenario valuations (bundle, v) keyed by "valuation_key".
+    If more than max_entries valuations are stored, the least recently used ones are removed.
+    Several processes can share the file (e.g. the workers of a backtest): the database uses a write-ahead log, so readers do not block 
+    the writer, every write is one transaction and a process waits up to "timeout" seconds for the write lock of another one.
+
+    Parameters
+    ----------
+    filename : String
+        SQLite database file. Created if it does not exist.
+    max_entries : int >0
+        Maximal number of stored valuations.
+    timeout : float
+        Seconds to wait for a lock held by another process before an error is raised.
+
+    """
+    
+    def __init__(self, filename="Valuation_Cache.sqlite", max_entries=1000000, timeout=600):
+        
+        self.filename = filename
+        self.max_entries = max_entries
+        
+        #Open database - transactions are started explicitly (see "_transaction")
+        self.connection = sqlite3.connect(filename, timeout=timeout, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        
+        #Create tables - the number of stored valuations is kept in "counters" and updated by every write
+        with self._transaction():
+            self.connection.execute("CREATE TABLE IF NOT EXISTS valuations (key TEXT PRIMARY KEY, bundle BLOB, valuation REAL, last_used REAL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS lru ON valuations (last_used)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+            self.connection.execute("INSERT OR IGNORE INTO counters SELECT 'entries', COUNT(*) FROM valuations")
+    
+    @contextlib.contextmanager
+    def _transaction(self):
+        """
+        Context manager of a write transaction - the write lock is taken at the start, i.e. a transaction never fails halfway 
+        because another process writes. Rolled back if an exception is raised.
+        """
+        
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+    
+    def _stored(self, keys):
+        """
+        Returns the rows (key, bundle, valuation) of all keys found in the cache.
+        """
+        
+        rows = []
+        keys = list(keys)
+        
+        #Query in chunks - SQLite limits the number of parameters per statement
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i+500]
+            rows.extend(self.connection.execute("SELECT key, bundle, valuation FROM valuations WHERE key IN (" + ",".join("?" * len(chunk)) + ")", chunk).fetchall())
+        
+        return rows
+        
+    def get(self, keys):
+        """
+        Returns a dictionary key -> (bundle, valuation) of all keys found in the cache.
+        """
+        
+        found = { key : (np.frombuffer(bundle, dtype=float).tolist(), valuation) for key, bundle, valuation in self._stored(keys) }
+        
+        #Mark as recently used
+        if found:
+            now = time.time()
+            with self._transaction():
+                self.connection.executemany("UPDATE valuations SET last_used = ? WHERE key = ?", [ (now, key) for key in found ])
+        
+        return found
+    
+    def put(self, items):
+        """
+        Stores a dictionary key -> (bundle, valuation) and removes least recently used entries above max_entries.
+        """
+        
+        now = time.time()
+        
+        with self._transaction():
+            
+            #Number of new valuations - replaced ones do not change the number of stored valuations
+            new = len(items) - len(self._stored(items))
+            self.connection.executemany("INSERT OR REPLACE INTO valuations VALUES (?, ?, ?, ?)", 
+                                        [ (key, np.asarray(bundle, dtype=float).tobytes(), float(valuation), now) for key, (bundle, valuation) in items.items() ])
+            entries = self.connection.execute("SELECT value FROM counters WHERE name = 'entries'").fetchone()[0] + new
+            
+            #Enforce size cap
+            excess = entries - self.max_entries
+            if excess > 0:
+                self.connection.execute("DELETE FROM valuations WHERE key IN (SELECT key FROM valuations ORDER BY last_used LIMIT ?)", (excess,))
+                entries = entries - excess
+            
+            self.connection.execute("UPDATE counters SET value = ? WHERE name = 'entries'", (entries,))
+        
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        
+        self.connection.close()
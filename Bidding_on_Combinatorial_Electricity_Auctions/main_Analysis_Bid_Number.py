@@ -8,6 +8,7 @@ from gurobipy import GRB #makes everything in class GRB available without a pref
 import numpy as np
 import random
 import sys
+import os
 from datetime import datetime, timedelta
 import csv
 import pandas as pd
@@ -16,6 +17,7 @@ import pandas as pd
 import Case_Study_Models as cs
 import Optimization_Models as bm
 import Auxiliary_Functions as func 
+import Valuation_Cache as vc
 
 
 #-------------------------
@@ -61,121 +63,129 @@ timelimit = 10*60
 #Time set - 24 hours
 Time_set = [i for i in range(24)]
 
+# Number of worker processes computing the perfect information bids if their table does not exist yet - use all cores
+processes = os.cpu_count()
+
 # Bid sizes
 bid_sizes = [10, 20, 30, 40, 50, 60, 70, 80] 
 
-#---------------------------
-# Iterating over case studies
-#---------------------------
+# Guard - worker processes import this file
+if __name__ == "__main__":
+
+    # Persistent cache of scenario valuations - each scenario is solved only once across the sweep and across runs
+    cache = vc.ValuationCache('Valuation_Cache.sqlite')
 
-for case_study in ["thermal generator", "battery", "demand response"]:
+    #---------------------------
+    # Iterating over case studies
+    #---------------------------
+
+    for case_study in ["thermal generator", "battery", "demand response"]:
     
-    # Load parameters for case study   
-    case_data = cs.case_data(case_study) 
+        # Load parameters for case study   
+        case_data = cs.case_data(case_study) 
     
-    #----------------------------------
-    # Write console output to .txt file
-    #----------------------------------
+        # Perfect information bids of all days - computed once (see main_Perfect_Information.py)
+        perfect_information = func.perfect_information_table(case_study, case_data, Time_set, processes=processes)
     
-    with open('Results_Sensitivity_Analysis/results_bidsize_' + case_study + "_" + bid_type + '.txt', 'w') as file:
+        #----------------------------------
+        # Write console output to .txt file
+        #----------------------------------
     
-        original_stdout = sys.stdout
-        sys.stdout = file
+        with open('Results_Sensitivity_Analysis/results_bidsize_' + case_study + "_" + bid_type + '.txt', 'w') as file:
     
-        #List of result lists
-        list_max_utility_lists = []
-        list_bid_utility_lists = []
-            
-        #----------------------
-        # Iterating over bid size
-        #-----------------------
-        
-        for size_bid in bid_sizes:
-            
-            #Initializing bid_set
-            Bid_set = [i for i in range(size_bid)] 
+            original_stdout = sys.stdout
+            sys.stdout = file
+    
+            #List of result lists - one list per bid size
+            list_max_utility_lists = [ [] for size_bid in bid_sizes ]
+            list_bid_utility_lists = [ [] for size_bid in bid_sizes ]
             
-            #Sub-List of results
-            max_utility_list = []
-            bid_utility_list = []
-                
             #--------------------------
             # Iterating over days
             #---------------------------
-            
+        
             for date in date_list:
-                
+            
                 #----------------
                 # Load forecast
                 #-----------------
-                
+            
                 Scenario_set = [i for i in range(number_scenarios)]
                 Prices = func.scenario_generation(date, number_scenarios)
                 Probabilities = [1/number_scenarios for i in Scenario_set]
-                
+            
                 #------------------------
-                # Generate bid
+                # Generate bids
                 #------------------------
-                    
-                bid, lp_runtime = bm.exclusive_linear(case_study, case_data, Time_set, Scenario_set, Bid_set, Prices, Probabilities, timelimit)
-                
-                #----------------------------
-                # Evaluating bid on real price
-                #----------------------------
-                
+            
+                # All bid sizes from one model - warm-started from the previous bid size
+                bids = bm.exclusive_linear_sweep(case_study, case_data, Time_set, Scenario_set, bid_sizes, Prices, Probabilities, timelimit, cache=cache)
+            
                 # Getting real price that day
                 real_price = func.real_price(date)
-                
-                # Determine traded bundle - exclusive: the most profitable one
-                bid_bundle, bid_utility = func.bid_outcome(case_study, case_data, Time_set, real_price, bid, bid_type, Bid_set)
-                 
+            
                 # Determine the demand of an agent and its maximal possible utility
-                best_bundle, max_utility = func.perfect_information_bid(case_study, case_data, Time_set, real_price)
+                row = func.date_index(date)
+                best_bundle, max_utility = perfect_information["bundles"][row], perfect_information["utilities"][row]
+            
+                #----------------------
+                # Iterating over bid size
+                #-----------------------
+            
+                for k, size_bid in enumerate(bid_sizes):
+                
+                    #Initializing bid_set
+                    Bid_set = [i for i in range(size_bid)] 
+                    bid, lp_runtime = bids[k]
+                
+                    #----------------------------
+                    # Evaluating bid on real price
+                    #----------------------------
+                
+                    # Determine traded bundle - exclusive: the most profitable one
+                    bid_bundle, bid_utility = func.bid_outcome(case_study, case_data, Time_set, real_price, bid, bid_type, Bid_set)
              
-                #----------------------------
-                # Output results in .txt file
-                #----------------------------
+                    #----------------------------
+                    # Output results in .txt file
+                    #----------------------------
                 
-                print("----------------------------------")
-                print("Day: ", date)
-                print("Bid size: ", size_bid)
-                print("Utility bid: ", bid_utility // 1)
-                print("Bundle bid: ", [int(i) for i in bid_bundle])
-                print("Maximal Utility: ", max_utility // 1)
-                print("Optimal bundle: ", [int(i) for i in best_bundle])
-                print("----------------------------------")
+                    print("----------------------------------")
+                    print("Day: ", date)
+                    print("Bid size: ", size_bid)
+                    print("Utility bid: ", bid_utility // 1)
+                    print("Bundle bid: ", [int(i) for i in bid_bundle])
+                    print("Maximal Utility: ", max_utility // 1)
+                    print("Optimal bundle: ", [int(i) for i in best_bundle])
+                    print("----------------------------------")
     
-                #----------------------------
-                # Append results to lists
-                #----------------------------   
+                    #----------------------------
+                    # Append results to lists
+                    #----------------------------   
     
-                max_utility_list.append(max_utility)
-                bid_utility_list.append(bid_utility)
-                    
-            list_max_utility_lists.append(max_utility_list)
-            list_bid_utility_lists.append(bid_utility_list)
+                    list_max_utility_lists[k].append(max_utility)
+                    list_bid_utility_lists[k].append(bid_utility)
                         
-        print("Computation finished")       
+            print("Computation finished")       
         
-        # Restore the original stdout
-        sys.stdout = original_stdout     
+            # Restore the original stdout
+            sys.stdout = original_stdout     
 
-    #----------------------------------
-    # Write results to .csv file
-    #----------------------------------
+        #----------------------------------
+        # Write results to .csv file
+        #----------------------------------
     
-    # First DataFrame: Maximal attainable utility
-    df1 = pd.DataFrame(list_max_utility_lists[0])
-    df1.columns = ["Maximal attainable utility"]
+        # First DataFrame: Maximal attainable utility
+        df1 = pd.DataFrame(list_max_utility_lists[0])
+        df1.columns = ["Maximal attainable utility"]
     
-    # Second DataFrame: Achieved utility by bids
-    df2 = pd.DataFrame(list_bid_utility_lists).T
-    df2.columns = ["Achieved utility, bid size =" + str(size) for size in bid_sizes]
+        # Second DataFrame: Achieved utility by bids
+        df2 = pd.DataFrame(list_bid_utility_lists).T
+        df2.columns = ["Achieved utility, bid size =" + str(size) for size in bid_sizes]
     
-    # Concatenate the DataFrames vertically
-    combined_df = pd.concat([df1, df2], axis=1)
+        # Concatenate the DataFrames vertically
+        combined_df = pd.concat([df1, df2], axis=1)
         
-    # Write the combined DataFrame to a CSV file
-    combined_df.to_csv('Results_Sensitivity_Analysis/results_bidsize_' + case_study + "_" + bid_type + '.csv', index=False)
+        # Write the combined DataFrame to a CSV file
+        combined_df.to_csv('Results_Sensitivity_Analysis/results_bidsize_' + case_study + "_" + bid_type + '.csv', index=False)
             
-print("Computation finished")     
\ No newline at end of file
+    print("Computation finished")     
\ No newline at end of file
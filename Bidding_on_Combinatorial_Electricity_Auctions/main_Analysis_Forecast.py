@@ -8,6 +8,7 @@ from gurobipy import GRB #makes everything in class GRB available without a pref
 import numpy as np
 import random
 import sys
+import os
 from datetime import datetime, timedelta
 import csv
 import pandas as pd
@@ -16,6 +17,7 @@ import pandas as pd
 import Case_Study_Models as cs
 import Optimization_Models as bm
 import Auxiliary_Functions as func 
+import Valuation_Cache as vc
 
 
 #-------------------------
@@ -64,134 +66,160 @@ timelimit = 60*60
 #Time set - 24 hours
 Time_set = [i for i in range(24)]
 
-#---------------------------
-# Iterating over case studies
-#---------------------------
+# Number of worker processes computing the perfect information bids if their table does not exist yet - use all cores
+processes = os.cpu_count()
 
-for case_study in ["thermal generator", "battery", "demand response"]:
+# Forecast improvement scalars
+scalars = [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1]
+
+# Guard - worker processes import this file
+if __name__ == "__main__":
+
+    # Persistent cache of scenario valuations - each scenario is solved only once across the sweep and across runs
+    cache = vc.ValuationCache('Valuation_Cache.sqlite')
+
+    #----------------------------------------------
+    # Generate forecasts for all scalars and days
+    #----------------------------------------------
+
+    # Array of price scenarios (scalars x days x scenarios x hours)
+    Prices_all = func.scenario_tensor(date_list, number_scenarios, scalars)
+
+    # Wasserstein distances between real price and scenarios (scalars x days) - closed form, the same for all case studies
+    Wasserstein_all = func.wasserstein_dirac([func.real_price(date) for date in date_list], func.scenario_tensor(date_list, number_scenarios), [1/number_scenarios for i in range(number_scenarios)], scalars)
+
+    #---------------------------
+    # Iterating over case studies
+    #---------------------------
+
+    for case_study in ["thermal generator", "battery", "demand response"]:
     
-    # Load parameters for case study   
-    case_data = cs.case_data(case_study) 
+        # Load parameters for case study   
+        case_data = cs.case_data(case_study) 
     
-    #----------------------------------
-    # Write console output to .txt file
-    #----------------------------------
+        # Perfect information bids of all days - computed once (see main_Perfect_Information.py)
+        perfect_information = func.perfect_information_table(case_study, case_data, Time_set, processes=processes)
     
-    with open('Results_Analysis_Forecast/results_wasserstein_' + case_study + "_" + bid_type + '.txt', 'w') as file:
+        #----------------------------------
+        # Write console output to .txt file
+        #----------------------------------
     
-        original_stdout = sys.stdout
-        sys.stdout = file
+        with open('Results_Analysis_Forecast/results_wasserstein_' + case_study + "_" + bid_type + '.txt', 'w') as file:
     
-        #List of result lists
-        list_max_utility_lists = []
-        list_bid_utility_lists = []
-        list_wass_distance_lists = []
+            original_stdout = sys.stdout
+            sys.stdout = file
+    
+            #List of result lists
+            list_max_utility_lists = []
+            list_bid_utility_lists = []
+            list_wass_distance_lists = []
             
-        #----------------------------------
-        # Iterating over forecast qualities
-        #----------------------------------
+            #----------------------------------
+            # Iterating over forecast qualities
+            #----------------------------------
         
-        for scalar in [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1]:
+            for k, scalar in enumerate(scalars):
             
-            #Initializing bid_set
-            Bid_set = [i for i in range(size_bid)] 
+                #Initializing bid_set
+                Bid_set = [i for i in range(size_bid)] 
             
-            #Sub-List of results
-            max_utility_list = []
-            bid_utility_list = []
-            wass_distance_list = []
+                #Sub-List of results
+                max_utility_list = []
+                bid_utility_list = []
+                wass_distance_list = []
                 
-            #--------------------------
-            # Iterating over days
-            #---------------------------
+                #--------------------------
+                # Iterating over days
+                #---------------------------
             
-            for date in date_list:
+                for j, date in enumerate(date_list):
                 
-                #----------------
-                # Load forecast
-                #-----------------
+                    #----------------
+                    # Load forecast
+                    #-----------------
                 
-                Scenario_set = [i for i in range(number_scenarios)]
-                Prices = func.scenario_generation_improved_information(date, number_scenarios, scalar)
-                Probabilities = [1/number_scenarios for i in Scenario_set]
+                    Scenario_set = [i for i in range(number_scenarios)]
+                    Prices = Prices_all[k, j]
+                    Probabilities = [1/number_scenarios for i in Scenario_set]
                 
-                #------------------------
-                # Generate bid
-                #------------------------
+                    #------------------------
+                    # Generate bid
+                    #------------------------
                     
-                bid, lp_runtime = bm.exclusive_linear(case_study, case_data, Time_set, Scenario_set, Bid_set, Prices, Probabilities, timelimit)
+                    bid, lp_runtime = bm.exclusive_linear(case_study, case_data, Time_set, Scenario_set, Bid_set, Prices, Probabilities, timelimit, cache=cache)
                 
-                #----------------------------
-                # Evaluating bid on real price
-                #----------------------------
+                    #----------------------------
+                    # Evaluating bid on real price
+                    #----------------------------
                 
-                # Getting real price that day
-                real_price = func.real_price(date)
+                    # Getting real price that day
+                    real_price = func.real_price(date)
                 
-                # Determine traded bundle - exclusive: the most profitable one
-                bid_bundle, bid_utility = func.bid_outcome(case_study, case_data, Time_set, real_price, bid, bid_type, Bid_set)
+                    # Determine traded bundle - exclusive: the most profitable one
+                    bid_bundle, bid_utility = func.bid_outcome(case_study, case_data, Time_set, real_price, bid, bid_type, Bid_set)
                  
-                # Determine the demand of an agent and its maximal possible utility
-                best_bundle, max_utility = func.perfect_information_bid(case_study, case_data, Time_set, real_price)
+                    # Determine the demand of an agent and its maximal possible utility
+                    row = func.date_index(date)
+                    best_bundle, max_utility = perfect_information["bundles"][row], perfect_information["utilities"][row]
                 
-                #-------------------------------
-                # Computing Wasserstein distance
-                #-------------------------------
+                    #-------------------------------
+                    # Computing Wasserstein distance
+                    #-------------------------------
                 
-                wass_distance = func.wasserstein_distance([real_price], [1], Prices, Probabilities)
+                    wass_distance = Wasserstein_all[k, j]
              
-                #----------------------------
-                # Output results in .txt file
-                #----------------------------
+                    #----------------------------
+                    # Output results in .txt file
+                    #----------------------------
                 
-                print("----------------------------------")
-                print("Day: ", date)
-                print("Bid size: ", size_bid)
-                print("Wasserstein distance: ", wass_distance)
-                print("Utility bid: ", bid_utility // 1)
-                print("Bundle bid: ", [int(i) for i in bid_bundle])
-                print("Maximal Utility: ", max_utility // 1)
-                print("Optimal bundle: ", [int(i) for i in best_bundle])
-                print("----------------------------------")
+                    print("----------------------------------")
+                    print("Day: ", date)
+                    print("Bid size: ", size_bid)
+                    print("Wasserstein distance: ", wass_distance)
+                    print("Utility bid: ", bid_utility // 1)
+                    print("Bundle bid: ", [int(i) for i in bid_bundle])
+                    print("Maximal Utility: ", max_utility // 1)
+                    print("Optimal bundle: ", [int(i) for i in best_bundle])
+                    print("----------------------------------")
     
-                #----------------------------
-                # Append results to lists
-                #----------------------------   
+                    #----------------------------
+                    # Append results to lists
+                    #----------------------------   
     
-                max_utility_list.append(max_utility)
-                bid_utility_list.append(bid_utility)
-                wass_distance_list.append(wass_distance)
+                    max_utility_list.append(max_utility)
+                    bid_utility_list.append(bid_utility)
+                    wass_distance_list.append(wass_distance)
                     
-            list_max_utility_lists.append(max_utility_list)
-            list_bid_utility_lists.append(bid_utility_list)
-            list_wass_distance_lists.append(wass_distance_list)
+                list_max_utility_lists.append(max_utility_list)
+                list_bid_utility_lists.append(bid_utility_list)
+                list_wass_distance_lists.append(wass_distance_list)
                         
-        print("Computation finished")       
+            print("Computation finished")       
         
-        # Restore the original stdout
-        sys.stdout = original_stdout     
+            # Restore the original stdout
+            sys.stdout = original_stdout     
         
-    #----------------------------------
-    # Write results to .csv file
-    #----------------------------------
+        #----------------------------------
+        # Write results to .csv file
+        #----------------------------------
     
-    # First DataFrame: Maximal attainable utility
-    df1 = pd.DataFrame(list_max_utility_lists[0])
-    df1.columns = ["Maximal attainable utility"]
+        # First DataFrame: Maximal attainable utility
+        df1 = pd.DataFrame(list_max_utility_lists[0])
+        df1.columns = ["Maximal attainable utility"]
     
-    # Second DataFrame: Achieved utility by bids
-    df2 = pd.DataFrame(list_bid_utility_lists).T
-    df2.columns = ["Achieved utility, scalar=" + str(scalar) for scalar in [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1]]
+        # Second DataFrame: Achieved utility by bids
+        df2 = pd.DataFrame(list_bid_utility_lists).T
+        df2.columns = ["Achieved utility, scalar=" + str(scalar) for scalar in scalars]
     
-    # Third DataFrame: Wasserstein distances of forecasts
-    df3 = pd.DataFrame(list_wass_distance_lists).T
-    df3.columns = ["Wasserstein distance, scalar=" + str(scalar) for scalar in [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1]]
+        # Third DataFrame: Wasserstein distances of forecasts
+        df3 = pd.DataFrame(list_wass_distance_lists).T
+        df3.columns = ["Wasserstein distance, scalar=" + str(scalar) for scalar in scalars]
     
-    # Concatenate the DataFrames vertically
-    combined_df = pd.concat([df1, df2, df3], axis=1)
+        # Concatenate the DataFrames vertically
+        combined_df = pd.concat([df1, df2, df3], axis=1)
         
-    # Write the combined DataFrame to a CSV file
-    combined_df.to_csv('Results_Analysis_Forecast/results_wasserstein_' + case_study + "_" + bid_type + '.csv', index=False)
+        # Write the combined DataFrame to a CSV file
+        combined_df.to_csv('Results_Analysis_Forecast/results_wasserstein_' + case_study + "_" + bid_type + '.csv', index=False)
             
-print("Computation finished")        
+    print("Computation finished")        
 
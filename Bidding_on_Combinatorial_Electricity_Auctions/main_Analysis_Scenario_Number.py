@@ -8,6 +8,7 @@ from gurobipy import GRB #makes everything in class GRB available without a pref
 import numpy as np
 import random
 import sys
+import os
 from datetime import datetime, timedelta
 import csv
 import pandas as pd
@@ -62,140 +63,153 @@ timelimit = 60*60
 #Time set - 24 hours
 Time_set = [i for i in range(24)]
 
+# Number of worker processes computing the perfect information bids if their table does not exist yet - use all cores
+processes = os.cpu_count()
+
 # Scenario numbers
 scenario_numbers = [120, 160, 200, 240, 280, 320, 360, 400]
 
-#---------------------------
-# Iterating over case studies
-#---------------------------
+# Guard - worker processes import this file
+if __name__ == "__main__":
+
+    #---------------------------
+    # Iterating over case studies
+    #---------------------------
 
-for case_study in ["battery", "demand response", "thermal generator"]:
+    for case_study in ["battery", "demand response", "thermal generator"]:
     
-    # Load parameters for case study   
-    case_data = cs.case_data(case_study) 
+        # Load parameters for case study   
+        case_data = cs.case_data(case_study) 
     
-    #----------------------------------
-    # Write console output to .txt file
-    #----------------------------------
+        # Perfect information bids of all days - computed once (see main_Perfect_Information.py)
+        perfect_information = func.perfect_information_table(case_study, case_data, Time_set, processes=processes)
     
-    with open('Results_Sensitivity_Analysis/results_scenarios_' + case_study + "_" + bid_type + '.txt', 'w') as file:
+        #----------------------------------
+        # Write console output to .txt file
+        #----------------------------------
     
-        original_stdout = sys.stdout
-        sys.stdout = file
+        with open('Results_Sensitivity_Analysis/results_scenarios_' + case_study + "_" + bid_type + '.txt', 'w') as file:
     
-        #List of result lists
-        list_max_utility_lists = []
-        list_bid_utility_lists = []
-        list_time_lists = []
-        list_lp_time_lists = []
-            
-        #----------------------
-        # Iterating over bid size
-        #-----------------------
+            original_stdout = sys.stdout
+            sys.stdout = file
+    
+            #List of result lists - one list per number of scenarios
+            list_max_utility_lists = [ [] for number_scenarios in scenario_numbers ]
+            list_bid_utility_lists = [ [] for number_scenarios in scenario_numbers ]
+            list_time_lists = [ [] for number_scenarios in scenario_numbers ]
+            list_lp_time_lists = [ [] for number_scenarios in scenario_numbers ]
         
-        for number_scenarios in scenario_numbers:
-            
             #Initializing bid_set
             Bid_set = [i for i in range(size_bid)] 
             
-            #Sub-List of results
-            max_utility_list = []
-            bid_utility_list = []
-            time_list = []
-            lp_time_list = []
-                
             #--------------------------
             # Iterating over days
             #---------------------------
-            
+        
             for date in date_list:
-                
+            
                 #----------------
                 # Load forecast
                 #-----------------
+            
+                # Scenarios of a smaller number are a prefix of the scenarios of a larger number - generated once for the largest number
+                Prices_all = func.scenario_generation(date, max(scenario_numbers))
+            
+                # Getting real price that day
+                real_price = func.real_price(date)
+            
+                # Determine the demand of an agent and its maximal possible utility
+                row = func.date_index(date)
+                best_bundle, max_utility = perfect_information["bundles"][row], perfect_information["utilities"][row]
+            
+                # Bundles and valuations of the solved scenarios - each scenario is solved only once per day
+                bundles, valuations = [], []
+                valuation_time = 0
+            
+                #----------------------
+                # Iterating over number of scenarios
+                #-----------------------
+            
+                for k, number_scenarios in enumerate(scenario_numbers):
                 
-                Scenario_set = [i for i in range(number_scenarios)]
-                Prices = func.scenario_generation(date, number_scenarios)
-                Probabilities = [1/number_scenarios for i in Scenario_set]
-                
-                #------------------------
-                # Generate bid
-                #------------------------
+                    Scenario_set = [i for i in range(number_scenarios)]
+                    Prices = Prices_all[:number_scenarios]
+                    Probabilities = [1/number_scenarios for i in Scenario_set]
                 
-                start_time = time.time() #measure time    
-                bid, lp_runtime = bm.exclusive_linear(case_study, case_data, Time_set, Scenario_set, Bid_set, Prices, Probabilities, timelimit)
-                end_time = time.time()
+                    #------------------------
+                    # Generate bid
+                    #------------------------
                 
-                #----------------------------
-                # Evaluating bid on real price
-                #----------------------------
+                    start_time = time.time() #measure time    
                 
-                # Getting real price that day
-                real_price = func.real_price(date)
+                    # Solve case study for the scenarios not contained in the previous prefix
+                    new_bundles, new_valuations = bm.scenario_valuations(case_study, case_data, Time_set, Scenario_set[len(bundles):], Prices, Probabilities)
+                    bundles, valuations = bundles + new_bundles, valuations + new_valuations
+                    valuation_time = valuation_time + time.time() - start_time
                 
-                # Determine traded bundle - exclusive: the most profitable one
-                bid_bundle, bid_utility = func.bid_outcome(case_study, case_data, Time_set, real_price, bid, bid_type, Bid_set)
+                    start_time = time.time() #measure time    
+                    bid, lp_runtime = bm.exclusive_linear(case_study, case_data, Time_set, Scenario_set, Bid_set, Prices, Probabilities, timelimit, scenario_solutions=(bundles, valuations))
+                    end_time = time.time()
                 
+                    #----------------------------
+                    # Evaluating bid on real price
+                    #----------------------------
                 
-                # Determine the demand of an agent and its maximal possible utility
-                best_bundle, max_utility = func.perfect_information_bid(case_study, case_data, Time_set, real_price)
+                    # Determine traded bundle - exclusive: the most profitable one
+                    bid_bundle, bid_utility = func.bid_outcome(case_study, case_data, Time_set, real_price, bid, bid_type, Bid_set)
              
-                #----------------------------
-                # Output results in .txt file
-                #----------------------------
+                    #----------------------------
+                    # Output results in .txt file
+                    #----------------------------
                 
-                print("----------------------------------")
-                print("Day: ", date)
-                print("Scenarios: ", number_scenarios)
-                print("Utility bid: ", bid_utility // 1)
-                print("Bundle bid: ", [int(i) for i in bid_bundle])
-                print("Maximal Utility: ", max_utility // 1)
-                print("Optimal bundle: ", [int(i) for i in best_bundle])
-                print("----------------------------------")
+                    print("----------------------------------")
+                    print("Day: ", date)
+                    print("Scenarios: ", number_scenarios)
+                    print("Utility bid: ", bid_utility // 1)
+                    print("Bundle bid: ", [int(i) for i in bid_bundle])
+                    print("Maximal Utility: ", max_utility // 1)
+                    print("Optimal bundle: ", [int(i) for i in best_bundle])
+                    print("----------------------------------")
     
-                #----------------------------
-                # Append results to lists
-                #----------------------------   
+                    #----------------------------
+                    # Append results to lists
+                    #----------------------------   
     
-                max_utility_list.append(max_utility)
-                bid_utility_list.append(bid_utility)
-                time_list.append(end_time - start_time)
-                lp_time_list.append(lp_runtime)
-                    
-            list_max_utility_lists.append(max_utility_list)
-            list_bid_utility_lists.append(bid_utility_list)
-            list_time_lists.append(time_list)
-            list_lp_time_lists.append(lp_time_list)
+                    # Computation time contains the solution of all scenarios of the prefix
+                    list_max_utility_lists[k].append(max_utility)
+                    list_bid_utility_lists[k].append(bid_utility)
+                    list_time_lists[k].append(valuation_time + end_time - start_time)
+                    list_lp_time_lists[k].append(lp_runtime)
                         
-        print("Computation finished")       
+            print("Computation finished")       
         
-        # Restore the original stdout
-        sys.stdout = original_stdout     
+            # Restore the original stdout
+            sys.stdout = original_stdout     
 
-    #----------------------------------
-    # Write results to .csv file
-    #----------------------------------
+        #----------------------------------
+        # Write results to .csv file
+        #----------------------------------
     
-    # First DataFrame: Maximal attainable utility
-    df1 = pd.DataFrame(list_max_utility_lists[0])
-    df1.columns = ["Maximal attainable utility"]
+        # First DataFrame: Maximal attainable utility
+        df1 = pd.DataFrame(list_max_utility_lists[0])
+        df1.columns = ["Maximal attainable utility"]
     
-    # Second DataFrame: Achieved utility by bids
-    df2 = pd.DataFrame(list_bid_utility_lists).T
-    df2.columns = ["Achieved utility, scenarios=" + str(size) for size in scenario_numbers]
+        # Second DataFrame: Achieved utility by bids
+        df2 = pd.DataFrame(list_bid_utility_lists).T
+        df2.columns = ["Achieved utility, scenarios=" + str(size) for size in scenario_numbers]
     
-    # Third DataFrame: Computation time
-    df3 = pd.DataFrame(list_time_lists).T
-    df3.columns = ["Computation time, scenarios=" + str(size) for size in scenario_numbers]
+        # Third DataFrame: Computation time
+        df3 = pd.DataFrame(list_time_lists).T
+        df3.columns = ["Computation time, scenarios=" + str(size) for size in scenario_numbers]
     
-    # Fourth DataFrame: LP time
-    df4 = pd.DataFrame(list_lp_time_lists).T
-    df4.columns = ["LP time, scenarios=" + str(size) for size in scenario_numbers]
+        # Fourth DataFrame: LP time
+        df4 = pd.DataFrame(list_lp_time_lists).T
+        df4.columns = ["LP time, scenarios=" + str(size) for size in scenario_numbers]
     
-    # Concatenate the DataFrames vertically
-    combined_df = pd.concat([df1, df2, df3, df4], axis=1)
+        # Concatenate the DataFrames vertically
+        combined_df = pd.concat([df1, df2, df3, df4], axis=1)
         
-    # Write the combined DataFrame to a CSV file
-    combined_df.to_csv('Results_Sensitivity_Analysis/results_scenarios_' + case_study + "_" + bid_type + '.csv', index=False)
+        # Write the combined DataFrame to a CSV file
+        combined_df.to_csv('Results_Sensitivity_Analysis/results_scenarios_' + case_study + "_" + bid_type + '.csv', index=False)
             
-print("Computation finished")     
\ No newline at end of file
+    print("Computation finished")     
\ No newline at end of file
@@ -8,6 +8,7 @@ from gurobipy import GRB #makes everything in class GRB available without a pref
 import numpy as np
 import random
 import sys
+import os
 from datetime import datetime, timedelta
 import csv
 import pandas as pd
@@ -59,132 +60,138 @@ bid_type = "self-schedule"
 # Define runtime limit of optimization in seconds
 timelimit = 60*60 
 
+# Scenario coupling formulation of the self-schedule - linear in the number of scenarios
+coupling = "first-stage"
+
+# Expected-price collapse (see "self_schedule") - off, the coupled model of all scenarios is solved
+collapse = False
+
 #Time set - 24 hours
 Time_set = [i for i in range(24)]
 
+# Number of worker processes computing the perfect information bids if their table does not exist yet - use all cores
+processes = os.cpu_count()
+
 # Scenario numbers
 scenario_numbers = [120, 160, 200, 240, 280, 320, 360, 400]
 
-#---------------------------
-# Iterating over case studies
-#---------------------------
+# Guard - worker processes import this file
+if __name__ == "__main__":
 
-for case_study in ["battery", "demand response", "thermal generator"]:
+    #---------------------------
+    # Iterating over case studies
+    #---------------------------
+
+    for case_study in ["battery", "demand response", "thermal generator"]:
     
-    # Load parameters for case study   
-    case_data = cs.case_data(case_study) 
+        # Load parameters for case study   
+        case_data = cs.case_data(case_study) 
     
-    #----------------------------------
-    # Write console output to .txt file
-    #----------------------------------
+        # Perfect information bids of all days - computed once (see main_Perfect_Information.py)
+        perfect_information = func.perfect_information_table(case_study, case_data, Time_set, processes=processes)
     
-    with open('Results_Sensitivity_Analysis/results_self-schedule_' + case_study + '.txt', 'w') as file:
+        #----------------------------------
+        # Write console output to .txt file
+        #----------------------------------
     
-        original_stdout = sys.stdout
-        sys.stdout = file
+        with open('Results_Sensitivity_Analysis/results_self-schedule_' + case_study + '.txt', 'w') as file:
     
-        #List of result lists
-        list_max_utility_lists = []
-        list_bid_utility_lists = []
-        list_time_lists = []
-            
-        #----------------------
-        # Iterating over bid size
-        #-----------------------
+            original_stdout = sys.stdout
+            sys.stdout = file
+    
+            #List of result lists - one list per number of scenarios
+            list_max_utility_lists = [ [] for number_scenarios in scenario_numbers ]
+            list_bid_utility_lists = [ [] for number_scenarios in scenario_numbers ]
+            list_time_lists = [ [] for number_scenarios in scenario_numbers ]
         
-        for number_scenarios in scenario_numbers:
-            
             #Initializing bid_set
             Bid_set = [i for i in range(size_bid)] 
             
-            #Sub-List of results
-            max_utility_list = []
-            bid_utility_list = []
-            time_list = []
-                
             #--------------------------
             # Iterating over days
             #---------------------------
-            
+        
             for date in date_list:
-                
+            
                 #----------------
                 # Load forecast
                 #-----------------
-                
-                Scenario_set = [i for i in range(number_scenarios)]
-                Prices = func.scenario_generation(date, number_scenarios)
-                Probabilities = [1/number_scenarios for i in Scenario_set]
-                
+            
+                # Scenarios of a smaller number are a prefix of the scenarios of a larger number - generated once for the largest number
+                Prices_all = func.scenario_generation(date, max(scenario_numbers))
+            
                 # Getting real price that day
                 real_price = func.real_price(date)
+            
+                # Determine the demand of an agent and its maximal possible utility
+                row = func.date_index(date)
+                best_bundle, max_utility = perfect_information["bundles"][row], perfect_information["utilities"][row]
+            
+                #----------------------
+                # Iterating over number of scenarios
+                #-----------------------
+            
+                for k, number_scenarios in enumerate(scenario_numbers):
                 
-                #------------------------
-                # Generate bid
-                #------------------------
-                
-                start_time = time.time() #measure time
-                bid_bundle, bid_utility = bm.self_schedule(case_study, case_data, Time_set, Scenario_set, Prices, Probabilities, timelimit, real_price)
-                end_time = time.time() #measure time
-                bid = bid_bundle
+                    Scenario_set = [i for i in range(number_scenarios)]
+                    Prices = Prices_all[:number_scenarios]
+                    Probabilities = [1/number_scenarios for i in Scenario_set]
                 
-                #----------------------------
-                # Evaluating bid on real price
-                #----------------------------
+                    #------------------------
+                    # Generate bid
+                    #------------------------
                 
-                # Determine the demand of an agent and its maximal possible utility
-                best_bundle, max_utility = func.perfect_information_bid(case_study, case_data, Time_set, real_price)
+                    start_time = time.time() #measure time
+                    bid, bid_utility = bm.self_schedule(case_study, case_data, Time_set, Scenario_set, Prices, Probabilities, timelimit, real_price, coupling=coupling, collapse=collapse)
+                    end_time = time.time() #measure time
+                    bid_bundle = bid.quantities[0]
              
-                #----------------------------
-                # Output results in .txt file
-                #----------------------------
+                    #----------------------------
+                    # Output results in .txt file
+                    #----------------------------
                 
-                print("----------------------------------")
-                print("Day: ", date)
-                print("Scenarios: ", number_scenarios)
-                print("Utility bid: ", bid_utility // 1)
-                print("Bundle bid: ", [int(i) for i in bid_bundle])
-                print("Maximal Utility: ", max_utility // 1)
-                print("Optimal bundle: ", [int(i) for i in best_bundle])
-                print("----------------------------------")
+                    print("----------------------------------")
+                    print("Day: ", date)
+                    print("Scenarios: ", number_scenarios)
+                    print("Utility bid: ", bid_utility // 1)
+                    print("Bundle bid: ", [int(i) for i in bid_bundle])
+                    print("Maximal Utility: ", max_utility // 1)
+                    print("Optimal bundle: ", [int(i) for i in best_bundle])
+                    print("----------------------------------")
     
-                #----------------------------
-                # Append results to lists
-                #----------------------------   
+                    #----------------------------
+                    # Append results to lists
+                    #----------------------------   
     
-                max_utility_list.append(max_utility)
-                bid_utility_list.append(bid_utility)
-                time_list.append(end_time - start_time)
-                    
-            list_max_utility_lists.append(max_utility_list)
-            list_bid_utility_lists.append(bid_utility_list)
-            list_time_lists.append(time_list)
+                    list_max_utility_lists[k].append(max_utility)
+                    list_bid_utility_lists[k].append(bid_utility)
+                    list_time_lists[k].append(end_time - start_time)
                         
-        print("Computation finished")       
+            print("Computation finished")       
         
-        # Restore the original stdout
-        sys.stdout = original_stdout     
+            # Restore the original stdout
+            sys.stdout = original_stdout     
 
-    #----------------------------------
-    # Write results to .csv file
-    #----------------------------------
+        #----------------------------------
+        # Write results to .csv file
+        #----------------------------------
     
-    # First DataFrame: Maximal attainable utility
-    df1 = pd.DataFrame(list_max_utility_lists[0])
-    df1.columns = ["Maximal attainable utility"]
+        # First DataFrame: Maximal attainable utility
+        df1 = pd.DataFrame(list_max_utility_lists[0])
+        df1.columns = ["Maximal attainable utility"]
     
-    # Second DataFrame: Achieved utility by bids
-    df2 = pd.DataFrame(list_bid_utility_lists).T
-    df2.columns = ["Achieved utility, scenarios=" + str(size) for size in scenario_numbers]
+        # Second DataFrame: Achieved utility by bids
+        df2 = pd.DataFrame(list_bid_utility_lists).T
+        df2.columns = ["Achieved utility, scenarios=" + str(size) for size in scenario_numbers]
     
-    # Third DataFrame: Computation time
-    df3 = pd.DataFrame(list_time_lists).T
-    df3.columns = ["Computation time, scenarios=" + str(size) for size in scenario_numbers]
+        # Third DataFrame: Computation time
+        df3 = pd.DataFrame(list_time_lists).T
+        df3.columns = ["Computation time, scenarios=" + str(size) for size in scenario_numbers]
     
-    # Concatenate the DataFrames vertically
-    combined_df = pd.concat([df1, df2, df3], axis=1)
+        # Concatenate the DataFrames vertically
+        combined_df = pd.concat([df1, df2, df3], axis=1)
         
-    # Write the combined DataFrame to a CSV file
-    combined_df.to_csv('Results_Sensitivity_Analysis/results_self-schedule_' + case_study + '.csv', index=False)
+        # Write the combined DataFrame to a CSV file
+        combined_df.to_csv('Results_Sensitivity_Analysis/results_self-schedule_' + case_study + '.csv', index=False)
             
-print("Computation finished")     
\ No newline at end of file
+    print("Computation finished")     
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+Executing this code runs the linear program for exclusive groups as fixed bidding policy over every day in Real_DE.csv 
+and writes the utility of the bid, the utility under perfect information and the captured share per day into one table per case study 
+(see "backtest"). An interrupted run resumes with the days not solved yet.
+"""
+
+#import packages
+import os
+import numpy as np
+
+#import functions
+import Case_Study_Models as cs
+import Backtest as bt
+
+
+if __name__ == "__main__":
+    
+    #--------------------------
+    # Computation parameters
+    #--------------------------
+    
+    #Time set - 24 hours
+    Time_set = [i for i in range(24)]
+    
+    # Bidding policy - exclusive group of 24 bids determined from 180 scenarios
+    policy = {"bid_type": "exclusive", "number_scenarios": 180, "number_bids": 24, "timelimit": 10*60}
+    
+    # Number of worker processes - use all cores
+    processes = os.cpu_count()
+    
+    #---------------------------
+    # Iterating over case studies
+    #---------------------------
+    
+    for case_study in ["thermal generator", "battery", "demand response"]:
+        
+        # Load parameters for case study   
+        case_data = cs.case_data(case_study) 
+        
+        # Run policy over all days and write table
+        table = bt.backtest(case_study, case_data, Time_set, policy, 'Results_Sensitivity_Analysis/backtest_' + case_study + "_" + policy["bid_type"] + '.npz', processes=processes)
+        
+        print(case_study + ": ", len(table["dates"]), " days")
+        print("Mean utility bid: ", np.mean(table["utilities"]))
+        print("Mean maximal utility: ", np.mean(table["max_utilities"]))
+        print("Captured share: ", np.sum(table["utilities"]) / np.sum(table["max_utilities"]))
+            
+    print("Computation finished")
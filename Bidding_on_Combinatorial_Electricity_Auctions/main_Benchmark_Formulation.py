@@ -0,0 +1,136 @@
+"""
+Executing this code compares the assignment formulation and the radius formulation of the linear program for exclusive groups
+(runtime and expected profit on the scenarios) across the bid number and scenario number sweeps of the sensitivity analysis.
+"""
+
+#import packages
+import numpy as np
+import random
+import sys
+from datetime import datetime, timedelta
+import pandas as pd
+
+#import functions
+import Case_Study_Models as cs
+import Optimization_Models as bm
+import Auxiliary_Functions as func
+import Valuation_Cache as vc
+
+
+#-------------------------
+# Dates for the whole year
+#-------------------------
+
+# Define the start and end date for the year 2017
+start_date = datetime(2017, 1, 1)
+end_date = datetime(2017, 12, 31)
+
+# Initialize an empty list to store the dates
+date_list = []
+
+# Loop through the dates and add them to the list
+current_date = start_date
+while current_date <= end_date:
+    date_list.append(current_date.strftime("%d/%m/%Y"))
+    current_date += timedelta(days=1)
+
+#-------------------------
+# Draw N random days
+#-------------------------
+
+# Set a seed for the random number generator
+random.seed(1)
+
+# Randomly select 20 dates from the date_list without replacement (no duplicates)
+date_list = random.sample(date_list, k=20)
+
+#--------------------------
+# Computation parameters
+#--------------------------
+
+# Define runtime limit of optimization in seconds
+timelimit = 10*60
+
+#Time set - 24 hours
+Time_set = [i for i in range(24)]
+
+# Persistent cache of scenario valuations - the formulations share the candidate bundles
+cache = vc.ValuationCache('Valuation_Cache.sqlite')
+
+# Sweeps (number of bids, number of scenarios) of main_Analysis_Bid_Number.py and main_Analysis_Scenario_Number.py
+sweeps = [ (size_bid, 180) for size_bid in [10, 20, 30, 40, 50, 60, 70, 80] ] + [ (24, number_scenarios) for number_scenarios in [120, 160, 200, 240, 280, 320, 360, 400] ]
+
+# Formulations under comparison
+formulations = ["assignment", "radius"]
+
+#---------------------------
+# Iterating over case studies
+#---------------------------
+
+for case_study in ["battery", "demand response", "thermal generator"]:
+
+    # Load parameters for case study
+    case_data = cs.case_data(case_study)
+
+    #List of results
+    results = []
+
+    #----------------------------------
+    # Write console output to .txt file
+    #----------------------------------
+
+    with open('Results_Sensitivity_Analysis/benchmark_formulation_' + case_study + '.txt', 'w') as file:
+
+        original_stdout = sys.stdout
+        sys.stdout = file
+
+        for size_bid, number_scenarios in sweeps:
+
+            #Initializing bid_set
+            Bid_set = [i for i in range(size_bid)]
+
+            for date in date_list:
+
+                #----------------
+                # Load forecast
+                #-----------------
+
+                Scenario_set = [i for i in range(number_scenarios)]
+                Prices = func.scenario_generation(date, number_scenarios)
+                Probabilities = [1/number_scenarios for i in Scenario_set]
+
+                #------------------------
+                # Generate bids
+                #------------------------
+
+                for formulation in formulations:
+
+                    bid, lp_runtime = bm.exclusive_linear(case_study, case_data, Time_set, Scenario_set, Bid_set, Prices, Probabilities, timelimit, cache=cache, formulation=formulation)
+
+                    # Expected profit of the bid on the scenarios - best response in each scenario
+                    profit = bm.profit_matrix(bid.quantities, bid.prices, Prices)
+                    expected_profit = np.maximum(profit.max(axis=0), 0) @ Probabilities
+
+                    print("----------------------------------")
+                    print("Day: ", date)
+                    print("Bids: ", size_bid, " Scenarios: ", number_scenarios)
+                    print("Formulation: ", formulation)
+                    print("Expected profit: ", expected_profit)
+                    print("LP time: ", lp_runtime)
+                    print("----------------------------------")
+
+                    results.append({"Day": date, "Bids": size_bid, "Scenarios": number_scenarios, "Formulation": formulation,
+                                    "Expected profit": expected_profit, "LP time": lp_runtime})
+
+        print("Computation finished")
+
+        # Restore the original stdout
+        sys.stdout = original_stdout
+
+    #----------------------------------
+    # Write results to .csv file
+    #----------------------------------
+
+    pd.DataFrame(results).to_csv('Results_Sensitivity_Analysis/benchmark_formulation_' + case_study + '.csv', index=False)
+
+print("Computation finished")
@@ -0,0 +1,40 @@
+"""
+Executing this code computes the perfect information bids of all days in Real_DE.csv for each case study 
+and writes them into tables which are read by the analyses (see "perfect_information_table").
+"""
+
+#import packages
+import os
+
+#import functions
+import Case_Study_Models as cs
+import Auxiliary_Functions as func 
+
+
+if __name__ == "__main__":
+    
+    #--------------------------
+    # Computation parameters
+    #--------------------------
+    
+    #Time set - 24 hours
+    Time_set = [i for i in range(24)]
+    
+    # Number of worker processes - use all cores
+    processes = os.cpu_count()
+    
+    #---------------------------
+    # Iterating over case studies
+    #---------------------------
+    
+    for case_study in ["thermal generator", "battery", "demand response"]:
+        
+        # Load parameters for case study   
+        case_data = cs.case_data(case_study) 
+        
+        # Solve all days and write table
+        table = func.perfect_information_table(case_study, case_data, Time_set, processes=processes)
+        
+        print(case_study + ": ", len(table["utilities"]), " days")
+            
+    print("Computation finished")
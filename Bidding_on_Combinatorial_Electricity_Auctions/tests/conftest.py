@@ -0,0 +1,17 @@
+"""
+The modules are imported by name and read the price data relative to the working directory -
+the tests run from the folder of the modules.
+"""
+
+import os
+import sys
+
+import pytest
+
+MODULE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MODULE_DIRECTORY)
+
+
+@pytest.fixture(autouse=True)
+def module_directory(monkeypatch):
+    monkeypatch.chdir(MODULE_DIRECTORY)
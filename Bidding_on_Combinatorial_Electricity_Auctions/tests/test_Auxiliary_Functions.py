@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import Auxiliary_Functions as func
+
+
+def reference_scenarios(forecast_date, number_scenarios, improvement_scalar=0):
+    #Scenarios built day by day from the csv files as before the price store
+    forecasts = pd.read_csv('Forecast_DE.csv')
+    prices = pd.read_csv('Real_DE.csv')
+    row_number = forecasts[ forecasts['Date'] == forecast_date ].index[0]
+
+    point_forecast = forecasts.loc[row_number, "h0":].values.flatten()
+    real_price_next_day = prices.loc[row_number, "h0":].values.flatten().astype(float)
+
+    scenarios = [point_forecast]
+    for i in range(number_scenarios-1):
+        residual = forecasts.loc[row_number-i-1, "h0":].values.flatten() - prices.loc[row_number-i-1, "h0":].values.flatten()
+        scenarios.append(point_forecast - residual)
+
+    scenarios = np.array(scenarios, dtype=float)
+
+    return scenarios - improvement_scalar * (scenarios - real_price_next_day)
+
+
+@pytest.mark.parametrize("forecast_date", ["01/01/2015", "05/03/2017", "31/12/2017"])
+def test_scenario_generation_matches_reference(forecast_date):
+    number_scenarios = func.date_index(forecast_date) + 1 if forecast_date == "01/01/2015" else 30
+
+    scenarios = func.scenario_generation(forecast_date, number_scenarios)
+
+    assert scenarios.shape == (number_scenarios, 24)
+    assert np.array_equal(scenarios, reference_scenarios(forecast_date, number_scenarios))
+
+
+def test_scenario_tensor_matches_per_date_scenarios():
+    dates = ["05/03/2017", "12/01/2016", "31/12/2017"]
+    improvement_scalars = [0, 0.25, 1]
+
+    scenarios = func.scenario_tensor(dates, 20, improvement_scalars)
+
+    assert scenarios.shape == (3, 3, 20, 24)
+    for k, improvement_scalar in enumerate(improvement_scalars):
+        for d, date in enumerate(dates):
+            assert np.allclose(scenarios[k, d], func.scenario_generation_improved_information(date, 20, improvement_scalar), rtol=0, atol=1e-12)
+            assert np.allclose(scenarios[k, d], reference_scenarios(date, 20, improvement_scalar), rtol=0, atol=1e-12)
+    assert np.array_equal(scenarios[0], func.scenario_tensor(dates, 20))
+
+
+def test_scenario_tensor_not_enough_past_days():
+    #The store starts on 01/01/2015 - the n-th day has n-1 past days
+    func.scenario_tensor("10/01/2015", 10)
+
+    with pytest.raises(ValueError):
+        func.scenario_tensor("10/01/2015", 11)
+    with pytest.raises(ValueError):
+        func.scenario_tensor(["05/03/2017", "10/01/2015"], 11)
+
+
+def test_scenario_reduction_k_medoids_duplicate_scenarios():
+    #Scenarios tightened to the real price are (nearly) identical - k-medoids gets representatives without assigned scenarios
+    Prices = func.scenario_generation_improved_information("05/03/2017", 10, 1)
+
+    indices, probabilities, distance = func.scenario_reduction(Prices, [0.1 for s in range(10)], 3, method="k-medoids")
+
+    assert len(indices) == 3
+    assert np.isclose(probabilities.sum(), 1)
+    assert np.isclose(distance, 0)
+
+
+def test_scenario_reduction_k_medoids_exact_duplicates():
+    Prices = np.repeat(func.scenario_generation("05/03/2017", 4), 3, axis=0)
+
+    indices, probabilities, distance = func.scenario_reduction(Prices, [1/12 for s in range(12)], 6, method="k-medoids")
+
+    assert len(indices) == 6
+    assert np.isclose(probabilities.sum(), 1)
+    assert np.isclose(distance, 0)
+
+
+def test_perfect_information_table_unknown_case_study(tmp_path):
+    filename = str(tmp_path / "table.npz")
+
+    assert func.perfect_information_table("wind farm", [], [i for i in range(24)], filename=filename) is None
+    assert not (tmp_path / "table.npz").exists()
+
+
+def test_wasserstein_dirac_matches_transport_problem():
+    dates = ["05/03/2017", "12/01/2016", "31/12/2017"]
+    improvement_scalars = [0, 0.3, 1]
+    rng = np.random.default_rng(0)
+    probabilities = rng.dirichlet(np.ones(15), size=len(dates))
+
+    real_prices = [func.real_price(date) for date in dates]
+    distances = func.wasserstein_dirac(real_prices, func.scenario_tensor(dates, 15), probabilities, improvement_scalars)
+
+    assert distances.shape == (3, 3)
+    for k, improvement_scalar in enumerate(improvement_scalars):
+        for d, date in enumerate(dates):
+            #Real price given twice - the closed form of "wasserstein_distance" is not used, the transport problem is solved
+            scenarios = func.scenario_generation_improved_information(date, 15, improvement_scalar)
+            distance = func.wasserstein_distance(scenarios, probabilities[d], [real_prices[d], real_prices[d]], [0.5, 0.5])
+            assert np.isclose(distances[k, d], distance, rtol=1e-9, atol=1e-9)
+            assert np.isclose(func.wasserstein_dirac(real_prices[d], scenarios, probabilities[d]), distance, rtol=1e-9, atol=1e-9)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import Auxiliary_Functions as func
+import Bid_Structure as bs
+import Case_Study_Models as cs
+
+Time_set = [i for i in range(24)]
+
+
+def example_bid():
+    quantities = np.arange(3 * 24, dtype=float).reshape(3, 24) / 10 - 3
+    return bs.Bid(quantities, [10.0, -5.0, 0.0])
+
+
+def test_construction():
+    self_schedule = bs.Bid([1.0, 2.0, 3.0])
+
+    assert self_schedule.quantities.shape == (1, 3)
+    assert np.isnan(self_schedule.prices).all()
+    with pytest.raises(ValueError):
+        bs.Bid([[1.0, 2.0], [3.0, 4.0]], [1.0])
+
+
+def test_read_only_views():
+    quantities = np.zeros((2, 24))
+    bid = bs.Bid(quantities, [1.0, 2.0])
+
+    assert np.shares_memory(bid.quantities, quantities)
+    with pytest.raises(ValueError):
+        bid.quantities[0, 0] = 1
+    with pytest.raises(ValueError):
+        bid.prices[0] = 1
+    quantities[0, 0] = 1 #array of the caller stays writeable
+
+
+def test_slicing():
+    bid = example_bid()
+
+    assert bid[1] == bs.Bid(bid.quantities[1], bid.prices[1:2])
+    assert np.shares_memory(bid[1].quantities, bid.quantities)
+    assert bid[-1] == bid[2:]
+    assert bid[[0, 2]] == bs.Bid(bid.quantities[[0, 2]], [10.0, 0.0])
+    assert len(bid[:2]) == 2
+
+
+def test_equality_and_hash():
+    bid = example_bid()
+    same = bs.Bid(bid.quantities.copy(), bid.prices.copy())
+
+    assert bid == same and hash(bid) == hash(same)
+    assert bid != bs.Bid(bid.quantities, [10.0, -5.0, 1.0])
+    assert bid != bid[:2]
+    assert bid != bid.to_dict()
+    assert bs.Bid([1.0, 2.0]) == bs.Bid([1.0, 2.0]) #NaN prices of self-schedules
+    assert len({bid, same, bid[:2]}) == 2
+
+
+def test_save_load(tmp_path):
+    bid = example_bid()
+
+    bid.save(str(tmp_path / "bid.npz"))
+
+    assert bs.Bid.load(str(tmp_path / "bid.npz")) == bid
+
+
+def test_dictionary_round_trip():
+    bid = example_bid()
+
+    dictionary = bid.to_dict()
+
+    assert sorted(dictionary) == ["p0", "p1", "p2", "x0", "x1", "x2"]
+    assert bs.Bid.from_dict(dictionary, [0, 1, 2]) == bid
+    assert bs.Bid.from_dict(dictionary, [2, 0]) == bid[[2, 0]]
+    assert bs.Bid.from_dict({"x0": [1.0, 2.0]}, [0]) == bs.Bid([1.0, 2.0])
+
+
+@pytest.mark.parametrize("bid_type", ["exclusive", "self-schedule"])
+def test_bid_outcome_of_dictionary(bid_type):
+    case_data = cs.case_data("battery")
+    real_price = func.real_price("05/03/2017")
+    bid = bs.Bid([[1.0] * 12 + [-0.9 * 0.9] * 12, [0.0] * 24], [-1e6, 0.0]) if bid_type == "exclusive" else bs.Bid([0.0] * 24)
+    Bid_set = [i for i in range(len(bid))]
+
+    bundle, utility = func.bid_outcome("battery", case_data, Time_set, real_price, bid.to_dict(), bid_type, Bid_set)
+
+    assert np.array_equal(bundle, func.bid_outcome("battery", case_data, Time_set, real_price, bid, bid_type, Bid_set)[0])
+    assert utility == func.bid_outcome("battery", case_data, Time_set, real_price, bid, bid_type, Bid_set)[1]
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+import Auxiliary_Functions as func
+import Case_Study_Models as cs
+import Optimization_Models as bm
+
+Time_set = [i for i in range(24)]
+
+
+def test_bundle_valuation_keeps_least_recently_used_limit(monkeypatch):
+    monkeypatch.setattr(cs, "_bundle_valuations", cs.OrderedDict())
+    monkeypatch.setattr(cs, "_max_bundle_valuations", 2)
+    case_data = cs.case_data("battery")
+    bundles = np.array([[0.1 * b * (-1)**t for t in Time_set] for b in range(4)])
+
+    #More distinct bundles than the limit in one batch
+    valuations = cs.bundle_valuation("battery", case_data, Time_set, bundles)
+
+    assert len(cs._bundle_valuations) == 2
+    assert np.array_equal(valuations, cs.case_study_valuation("battery", case_data, Time_set, bundles), equal_nan=True)
+
+    #A looked up bundle becomes the most recently used
+    cs.bundle_valuation("battery", case_data, Time_set, bundles[2])
+    cs.bundle_valuation("battery", case_data, Time_set, bundles[0])
+    assert [ key[-1] for key in cs._bundle_valuations ] == [bundles[2].tobytes(), bundles[0].tobytes()]
+
+
+def test_model_template_keeps_least_recently_used_limit(monkeypatch):
+    monkeypatch.setattr(cs, "_model_templates", cs.OrderedDict())
+    monkeypatch.setattr(cs, "_max_model_templates", 1)
+    case_data = cs.case_data("battery")
+
+    m = cs.model_template("battery", case_data, Time_set, 1)
+    assert cs.model_template("battery", case_data, Time_set, 1) is m
+
+    cs.model_template("battery", case_data, Time_set, 2)
+    assert len(cs._model_templates) == 1
+    assert cs.model_template("battery", case_data, Time_set, 1) is not m
+
+
+@pytest.mark.parametrize("offset, feasible", [(1e-9, True), (1e-5, True), (1e-3, False)])
+def test_template_valuation_bundle_on_bounds(offset, feasible):
+    case_data = cs.case_data("demand response")
+    bundle, valuation = bm.single_scenario_valuation("demand response", case_data, Time_set, func.real_price("12/01/2017"))
+    bundle = np.array(bundle)
+    m = cs.model_template("demand response", case_data, Time_set, 1)
+    lower, upper = bundle == np.array(m._lb), bundle == np.array(m._ub)
+    assert lower.any() and upper.any()
+
+    #Quantities pushed outside their bounds (e.g. -1e-5 against the lower bound 0) - beyond the feasibility tolerance of gurobi
+    perturbed = bundle - offset * lower + offset * upper
+    valuations = cs.template_valuation("demand response", case_data, Time_set, np.array([bundle, perturbed]), tolerance=1e-4)
+
+    assert np.isclose(valuations[0], valuation)
+    if feasible:
+        assert np.isclose(valuations[1], valuation)
+    else:
+        assert np.isnan(valuations[1])
+
+
+#Thermal generator also starting on for 2 hours and off for 2 hours (Initial_operating_state, Initial_off_hours, Initial_on_hours)
+@pytest.mark.parametrize("case_study, initial_state", [("thermal generator", None), ("thermal generator", [1, 0, 2]), ("thermal generator", [0, 2, 0]), 
+                                                       ("battery", None), ("demand response", None)])
+def test_matrix_builders_match_original_builders(case_study, initial_state):
+    case_data = cs.case_data(case_study)
+    if initial_state is not None:
+        case_data = case_data[:11] + initial_state
+    Scenario_set = [s for s in range(3)]
+    Prices = func.scenario_generation("05/03/2017", 3).tolist()
+    Probabilities = [1/3 for s in Scenario_set]
+
+    models = [ cs.case_study_model(case_study, case_data, Time_set, Scenario_set, Prices, Probabilities, matrix=matrix) for matrix in [False, True] ]
+
+    for attribute in ["NumVars", "NumIntVars", "NumBinVars", "NumNZs"]:
+        assert models[0].getAttr(attribute) == models[1].getAttr(attribute), attribute
+
+    #Constraints without variables (e.g. 0 <= 0 of the thermal generator) are not built by the matrix API
+    assert len(set( np.count_nonzero(np.diff(m.getA().tocsr().indptr)) for m in models )) == 1
+
+    #Same MIP and LP relaxation
+    objectives = []
+    for m in models + [ m.relax() for m in models ]:
+        m.Params.LogToConsole = 0
+        m.optimize()
+        objectives.append(m.ObjVal)
+
+    assert np.isclose(objectives[0], objectives[1])
+    assert np.isclose(objectives[2], objectives[3])
+
+
+def valuation_bundles(case_study, case_data):
+    #Optimal bundles of several days and perturbations of them (many infeasible)
+    rng = np.random.default_rng(0)
+    optimal = np.array([ bm.single_scenario_valuation(case_study, case_data, Time_set, price)[0] 
+                         for price in func.scenario_generation("05/03/2017", 6).tolist() + [func.real_price("12/01/2017"), func.real_price("01/07/2017")] ])
+    perturbed = [ optimal * 0.5, optimal * 1.1, np.roll(optimal, 1, axis=1), optimal + rng.choice([-5, 0, 5], size=optimal.shape), 
+                  np.where(rng.random(optimal.shape) < 0.1, 0, optimal), np.zeros((1, len(Time_set))) ]
+
+    return np.vstack([optimal] + perturbed)
+
+
+#Thermal generator: (Initial_operating_state, Initial_off_hours, Initial_on_hours) and (Min_up_time, Min_down_time) - battery: (Initial_StateofCharge)
+@pytest.mark.parametrize("case_study, changes", [("thermal generator", {}), 
+                                                 ("thermal generator", {11: 200, 13: 2}), 
+                                                 ("thermal generator", {12: 2}), 
+                                                 ("thermal generator", {9: 2, 10: 3}), 
+                                                 ("thermal generator", {9: 1, 10: 1, 11: 300, 13: 1}), 
+                                                 ("battery", {}), 
+                                                 ("battery", {6: 0}), 
+                                                 ("battery", {6: 20})])
+def test_closed_form_valuation_matches_template(case_study, changes):
+    case_data = [ changes.get(i, value) for i, value in enumerate(cs.case_data(case_study)) ]
+    bundles = valuation_bundles(case_study, case_data)
+
+    valuations = cs.case_study_valuation(case_study, case_data, Time_set, bundles)
+    solved = cs.template_valuation(case_study, case_data, Time_set, bundles, chunk_size=4)
+
+    assert np.isnan(valuations).any() and not np.isnan(valuations).all()
+    assert np.array_equal(np.isnan(valuations), np.isnan(solved))
+    assert np.allclose(valuations, solved, rtol=1e-9, atol=1e-6, equal_nan=True)
@@ -0,0 +1,193 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import Auxiliary_Functions as func
+import Case_Study_Models as cs
+import Optimization_Models as bm
+
+Time_set = [i for i in range(24)]
+
+
+def expected_profit(profit, Probabilities, selected):
+    #Each scenario is assigned to its most profitable selected bundle or not at all
+    return np.asarray(Probabilities) @ np.maximum(profit[list(selected)].max(axis=0), 0)
+
+
+def optimal_profit(profit, Probabilities, number_bids):
+    return max( expected_profit(profit, Probabilities, selected) for selected in itertools.combinations(range(len(profit)), number_bids) )
+
+
+def random_instances(number_instances, seed=0):
+    #Small selection problems (B x S profits with negative entries, probabilities, number of bids) solvable by brute force
+    rng = np.random.default_rng(seed)
+    for i in range(number_instances):
+        number_candidates, number_scenarios = rng.integers(2, 9), rng.integers(1, 10)
+        Probabilities = rng.dirichlet(np.ones(number_scenarios))
+        yield rng.normal(size=(number_candidates, number_scenarios)).round(1), Probabilities, int(rng.integers(1, number_candidates + 1))
+
+
+def bid_profit(case_study, **options):
+    #Expected profit of an exclusive bid of 3 atomic bids for 10 scenarios
+    case_data = cs.case_data(case_study)
+    Scenario_set = [s for s in range(10)]
+    Prices = func.scenario_generation("05/03/2017", 10)
+    Probabilities = [1/10 for s in Scenario_set]
+    scenario_solutions = bm.scenario_valuations(case_study, case_data, Time_set, Scenario_set, Prices, Probabilities, processes=1)
+
+    bid, runtime = bm.exclusive_linear(case_study, case_data, Time_set, Scenario_set, [0, 1, 2], Prices, Probabilities, 60, 
+                                       scenario_solutions=scenario_solutions, **options)
+    profit = bm.profit_matrix(bid.quantities, bid.prices, Prices)
+
+    return expected_profit(profit, Probabilities, range(len(bid)))
+
+
+def test_unique_rows_merges_rounding_duplicates():
+    #Scenarios tightened to the real price are identical up to floating-point rounding
+    Prices = func.scenario_generation_improved_information("05/03/2017", 10, 1)
+
+    first, inverse = bm.unique_rows(Prices)
+
+    assert len(first) == 1
+    assert np.array_equal(inverse, np.zeros(10))
+
+
+def test_unique_rows_first_occurrence_order():
+    rows = np.array([[2.0, 0.0], [1.0, 0.0], [2.0, 1e-9], [1.0, 5.0]])
+
+    first, inverse = bm.unique_rows(rows)
+
+    assert first.tolist() == [0, 1, 3]
+    assert inverse.tolist() == [0, 1, 0, 2]
+
+
+def test_scenario_valuations_solves_rounding_duplicates_once(monkeypatch):
+    Prices = func.scenario_generation_improved_information("05/03/2017", 10, 1)
+    Scenario_set = [i for i in range(10)]
+
+    solved = []
+    single_scenario_valuation = bm.single_scenario_valuation
+    def counting_valuation(*args):
+        solved.append(args)
+        return single_scenario_valuation(*args)
+    monkeypatch.setattr(bm, "single_scenario_valuation", counting_valuation)
+
+    bundles, valuations = bm.scenario_valuations("battery", cs.case_data("battery"), Time_set, Scenario_set, Prices, [0.1 for s in Scenario_set], processes=1)
+
+    assert len(solved) == 1
+    assert np.isclose(solved[0][4], 1) #merged scenario carries the summed probability
+    assert len(bundles) == 10 and len(valuations) == 10
+
+
+def test_merge_candidates_merges_rounding_duplicates(capsys):
+    Prices = func.scenario_generation_improved_information("05/03/2017", 10, 1)
+    bundles = [ [float(t) for t in Time_set] for s in range(10) ]
+
+    unique_bundles, unique_prices, unique_probabilities = bm.merge_candidates(bundles, Prices, [0.1 for s in range(10)])
+    assert capsys.readouterr().out == ""
+
+    assert unique_bundles.tolist() == [0]
+    assert np.array_equal(unique_prices, Prices[:1])
+    assert np.allclose(unique_probabilities, [1])
+
+
+def test_assignment_presolve_prints_only_if_verbose(capsys):
+    profit = np.array([[3.0, 0.0], [2.0, -1.0], [0.0, 4.0]])
+
+    candidates, pair_bundle, pair_scenario = bm.assignment_presolve(profit, 2)
+    assert capsys.readouterr().out == ""
+    assert candidates.tolist() == [0, 2]
+    assert list(zip(candidates[pair_bundle].tolist(), pair_scenario.tolist())) == [(0, 0), (2, 1)]
+
+    bm.assignment_presolve(profit, 2, verbose=True)
+    assert "Presolve removed 1 of 3 candidate bundles" in capsys.readouterr().out
+
+
+def test_greedy_selection_random_instances():
+    for profit, Probabilities, number_bids in random_instances(300):
+        selected, value = bm.greedy_selection(profit, Probabilities, number_bids)
+
+        assert len(set(selected.tolist())) == len(selected) == number_bids
+        assert np.isclose(value, expected_profit(profit, Probabilities, selected))
+        assert value <= optimal_profit(profit, Probabilities, number_bids) + 1e-12
+
+
+def test_greedy_selection_keeps_initial_size():
+    profit = np.array([[1.0, 0.0, 0.0], [0.0, 2.0, 0.0], [0.0, 0.0, 3.0]])
+
+    selected, value = bm.greedy_selection(profit, [1/3, 1/3, 1/3], 3, initial=[2])
+
+    assert selected.tolist() == [0, 1, 2]
+    assert np.isclose(value, 2)
+
+
+@pytest.mark.parametrize("case_study", ["battery", "demand response"])
+@pytest.mark.parametrize("presolve, mip_start", [(True, True), (True, False), (False, True)])
+def test_presolve_and_mip_start_keep_the_bid(case_study, presolve, mip_start):
+    #Default bid path of the experiments against the plain assignment model
+    assert np.isclose(bid_profit(case_study, presolve=presolve, mip_start=mip_start), bid_profit(case_study, presolve=False, mip_start=False))
+
+
+def test_greedy_engine_at_most_mip():
+    assert bid_profit("battery", engine="greedy") <= bid_profit("battery") + 1e-9
+
+
+def test_lagrangian_selection_bounds_random_instances():
+    for profit, Probabilities, number_bids in random_instances(300, seed=1):
+        selected, value, bound = bm.lagrangian_selection(profit, Probabilities, number_bids)
+        optimum = optimal_profit(profit, Probabilities, number_bids)
+
+        assert len(set(selected.tolist())) == len(selected) == number_bids
+        assert np.isclose(value, expected_profit(profit, Probabilities, selected))
+        assert value <= optimum + 1e-12
+        assert bound >= optimum - 1e-9
+
+
+def test_lagrangian_engine_between_greedy_and_mip():
+    #The primal selection starts from the greedy selection
+    value = bid_profit("battery", engine="lagrangian")
+
+    assert bid_profit("battery", engine="greedy") - 1e-9 <= value <= bid_profit("battery") + 1e-9
+
+
+def test_radius_levels_objective_random_instances():
+    for profit, Probabilities, number_bids in random_instances(300, seed=2):
+        level_scenario, level_profit, increment, covering, fixed = bm.radius_levels(profit, number_bids)
+
+        #Any selection of at least number_bids bundles - z[s,k] = 1 if a selected bundle reaches level k of scenario s
+        for size in range(number_bids, len(profit) + 1):
+            for selected in itertools.combinations(range(len(profit)), size):
+                z = np.minimum(covering @ np.isin(np.arange(len(profit)), selected), 1)
+                value = Probabilities @ fixed + Probabilities[level_scenario] @ (increment * z)
+
+                assert np.isclose(value, expected_profit(profit, Probabilities, selected))
+
+
+def test_radius_formulation_matches_assignment():
+    assert np.isclose(bid_profit("battery", formulation="radius"), bid_profit("battery"))
+    assert np.isclose(bid_profit("demand response", formulation="radius"), bid_profit("demand response"))
+
+
+@pytest.mark.parametrize("case_study", ["battery", "demand response"])
+@pytest.mark.parametrize("presolve", [True, False])
+def test_lazy_linking_matches_full_linking(case_study, presolve):
+    assert np.isclose(bid_profit(case_study, linking="lazy", presolve=presolve), bid_profit(case_study, linking="full", presolve=presolve))
+
+
+@pytest.mark.parametrize("coupling", ["pairwise", "first-stage"])
+def test_self_schedule_single_representative(coupling):
+    #Reduced to one scenario (numbered 0) - the self-schedule is the optimal bundle of that scenario
+    case_data = cs.case_data("battery")
+    Scenario_set = [s for s in range(10)]
+    Prices = func.scenario_generation("05/03/2017", 10)
+    Probabilities = [1/10 for s in Scenario_set]
+
+    bid, utility = bm.self_schedule("battery", case_data, Time_set, Scenario_set, Prices, Probabilities, 60, func.real_price("05/03/2017"), 
+                                    coupling=coupling, reduce_to=1)
+    representative = bm.reduce_scenarios(Scenario_set, Prices, Probabilities, 1)[1][0]
+    bundle, valuation = bm.single_scenario_valuation("battery", case_data, Time_set, representative)
+
+    assert bid.quantities.shape == (1, 24)
+    assert np.isclose(cs.bundle_utility("battery", case_data, Time_set, bid.quantities[0], representative), valuation - np.dot(representative, bundle))
+    assert np.isclose(utility, cs.bundle_utility("battery", case_data, Time_set, bid.quantities[0], func.real_price("05/03/2017")))
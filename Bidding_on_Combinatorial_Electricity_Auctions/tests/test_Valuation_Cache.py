@@ -0,0 +1,124 @@
+import itertools
+from multiprocessing import Pool
+
+import numpy as np
+
+import Auxiliary_Functions as func
+import Case_Study_Models as cs
+import Optimization_Models as bm
+import Valuation_Cache as vc
+
+Time_set = [i for i in range(24)]
+
+
+def test_valuation_key_stable():
+    case_data = cs.case_data("battery")
+    price = func.real_price("05/03/2017")
+
+    key = vc.valuation_key("battery", case_data, Time_set, price)
+
+    assert key == vc.valuation_key("battery", list(case_data), range(24), np.array(price).tolist())
+    assert key != vc.valuation_key("thermal generator", case_data, Time_set, price)
+    assert key != vc.valuation_key("battery", case_data, Time_set[:-1], price[:-1])
+
+
+def test_valuation_key_near_identical_prices():
+    case_data = cs.case_data("battery")
+    price = np.array(func.real_price("05/03/2017"), dtype=float)
+    price[0] = 0
+
+    key = vc.valuation_key("battery", case_data, Time_set, price)
+
+    assert key == vc.valuation_key("battery", case_data, Time_set, price * (1 + 1e-12))
+    assert key == vc.valuation_key("battery", case_data, Time_set, price - 1e-12)
+    assert key != vc.valuation_key("battery", case_data, Time_set, price + 1e-3)
+
+
+def test_round_trip(tmp_path):
+    filename = str(tmp_path / "cache.sqlite")
+    cache = vc.ValuationCache(filename)
+
+    cache.put({"a": ([1.0, -2.5], 3.0), "b": ([0.0, 0.0], -1.0)})
+    assert cache.get(["a", "b", "c"]) == {"a": ([1.0, -2.5], 3.0), "b": ([0.0, 0.0], -1.0)}
+    cache.close()
+
+    #Persistent - found again after reopening
+    cache = vc.ValuationCache(filename)
+    assert cache.get(["b"]) == {"b": ([0.0, 0.0], -1.0)}
+    cache.close()
+
+
+def test_least_recently_used_eviction(tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(vc.time, "time", lambda: next(clock))
+    cache = vc.ValuationCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+
+    cache.put({"a": ([1.0], 1.0)})
+    cache.put({"b": ([2.0], 2.0)})
+    cache.get(["a"])
+    cache.put({"c": ([3.0], 3.0)})
+
+    assert set(cache.get(["a", "b", "c"])) == {"a", "c"}
+    cache.close()
+
+
+def test_cache_hit_equals_solve(tmp_path, monkeypatch):
+    case_data = cs.case_data("battery")
+    Scenario_set = [s for s in range(6)]
+    Prices = func.scenario_generation("05/03/2017", 6)
+    Probabilities = [1/6 for s in Scenario_set]
+    cache = vc.ValuationCache(str(tmp_path / "cache.sqlite"))
+
+    solved = bm.scenario_valuations("battery", case_data, Time_set, Scenario_set, Prices, Probabilities, processes=1, cache=cache)
+
+    #All scenarios are found - nothing is solved
+    def no_solve(*args):
+        raise AssertionError("scenario solved despite cache hit")
+    monkeypatch.setattr(bm, "single_scenario_valuation", no_solve)
+
+    assert bm.scenario_valuations("battery", case_data, Time_set, Scenario_set, Prices, Probabilities, processes=1, cache=cache) == solved
+    assert bm.scenario_valuations("battery", case_data, Time_set, Scenario_set, Prices + 1e-9, Probabilities, processes=1, cache=cache) == solved
+    cache.close()
+
+
+def stored_entries(cache):
+    #Counter of the stored valuations and actual number of rows
+    return (cache.connection.execute("SELECT value FROM counters WHERE name = 'entries'").fetchone()[0], 
+            cache.connection.execute("SELECT COUNT(*) FROM valuations").fetchone()[0])
+
+
+def test_entry_counter(tmp_path):
+    filename = str(tmp_path / "cache.sqlite")
+    cache = vc.ValuationCache(filename, max_entries=5)
+
+    cache.put({"a": ([1.0], 1.0), "b": ([2.0], 2.0)})
+    cache.put({"a": ([1.5], 1.5), "c": ([3.0], 3.0)}) #"a" is replaced
+    assert stored_entries(cache) == (3, 3)
+
+    cache.put({ str(i) : ([float(i)], float(i)) for i in range(4) })
+    assert stored_entries(cache) == (5, 5)
+    cache.close()
+
+    cache = vc.ValuationCache(filename, max_entries=5)
+    assert stored_entries(cache) == (5, 5)
+    cache.close()
+
+
+def use_cache(filename, worker):
+    #Each worker writes and reads through its own connection
+    cache = vc.ValuationCache(filename, max_entries=150)
+    for i in range(100):
+        cache.put({ str((worker + j) % 8) + "-" + str(i) : ([float(i)], float(worker)) for j in range(2) })
+        cache.get([ str(w) + "-" + str(i) for w in range(8) ])
+    cache.close()
+
+
+def test_concurrent_processes(tmp_path):
+    filename = str(tmp_path / "cache.sqlite")
+
+    with Pool(4) as pool:
+        pool.starmap(use_cache, [ (filename, worker) for worker in range(8) ])
+
+    cache = vc.ValuationCache(filename, max_entries=150)
+    assert stored_entries(cache) == (150, 150)
+    cache.close()